@@ -4,6 +4,8 @@ import yaml
 import json
 from datetime import datetime
 
+from scanner.finding import from_document
+
 
 def load_config():
     """Load configuration from YAML file."""
@@ -167,6 +169,13 @@ def create_jira_ticket(finding, config, issue_type_id):
         return None
 
 
+def expand_findings(results):
+    """Copy the rule text back into findings that refer to it by ID."""
+    if isinstance(results, list):
+        return results
+    return from_document(results)
+
+
 def process_findings():
     """Process security findings and create Jira tickets."""
     try:
@@ -194,7 +203,7 @@ def process_findings():
 
         # Load findings from the JSON file
         with open('aws-scan-results.json') as f:
-            findings = json.load(f)
+            findings = expand_findings(json.load(f))
 
         # Create tickets for high and medium risk findings
         for finding in findings:
@@ -1,6 +1,19 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import threading
+from contextlib import contextmanager
+from typing import List, Literal, Optional
+
+from fastapi import FastAPI, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from scanner import s3, iam, ec2, sg
+from pydantic import BaseModel
+from scanner import s3, iam, ec2, sg, regions, organization
+from scanner.clients import ClientFactory
+from scanner.context import ScanContext
+from scanner.finding import to_document
+from scanner.jobs import JobManager, DEFAULT_MAX_JOBS
+from scanner.ratelimit import RateLimiter
+from scanner.state import StateStore
+from report import stream
 from report.generator import generate_report
 from auth.basic import verify_credentials
 from alert.email import send_email_alert
@@ -10,6 +23,15 @@ from config.loader import ConfigLoader
 app = FastAPI()
 security = HTTPBasic()
 config = ConfigLoader()
+# boto3 clients are shared across requests instead of built per scan
+clients = ClientFactory(
+    max_pool_connections=config.get('scanner.max_pool_connections', 50),
+    retry_mode=config.get('scanner.retry_mode', 'standard'),
+    max_attempts=config.get('scanner.max_attempts', 10),
+    rate_limiter=RateLimiter(rate=config.get('scanner.api_rate', 20))
+)
+# Scans submitted through POST /scans run here, a few at a time
+jobs = JobManager(max_workers=config.get('scanner.max_jobs', DEFAULT_MAX_JOBS))
 
 
 def get_current_user(credentials: HTTPBasicCredentials = Depends(security)):
@@ -18,32 +40,255 @@ def get_current_user(credentials: HTTPBasicCredentials = Depends(security)):
     return credentials.username
 
 
-@app.get("/scan/s3")
-def scan_s3(user: str = Depends(get_current_user)):
-    results = s3.scan()
+@contextmanager
+def scan_state():
+    # Incremental scanning is off unless a state database is configured
+    path = config.get('scanner.state_path')
+    if not path:
+        yield None
+        return
+    hours = config.get('scanner.full_refresh_hours', 24)
+    state = StateStore(path, full_refresh_seconds=hours * 3600)
+    try:
+        yield state
+    finally:
+        state.close()
+
+
+def scan_context():
+    # Describe results are per request; clients are shared
+    return ScanContext(memoize=False, clients=clients)
+
+
+@contextmanager
+def job_scope():
+    # A job's scanners share one memoizing context, so EC2 and security
+    # groups read the network interfaces once
+    with scan_state() as state:
+        yield state, ScanContext(clients=clients)
+
+
+def job_scanner(scanner):
+    # Job scanners are called with the (state, context) from job_scope
+    return lambda scope: scanner(*scope)
+
+
+def regional_scan(service, scanner, context=None, **options):
+    # Fan out over scanner.regions ('all' or a list), else the default region
+    region_names = config.get('scanner.regions')
+    context = context or scan_context()
+    if not region_names:
+        return scanner(context=context, **options)
+    return regions.iter_scan(
+        services=(service,),
+        regions=None if region_names == 'all' else list(region_names),
+        max_workers=config.get(
+            'scanner.max_regions', regions.DEFAULT_MAX_WORKERS
+        ),
+        context=context,
+        options={service: options}
+    )
+
+
+def run_s3(state, context=None):
+    return s3.iter_scan(
+        max_workers=config.get('scanner.max_workers', s3.DEFAULT_MAX_WORKERS),
+        state=state,
+        context=context or scan_context()
+    )
+
+
+def run_iam(state, context=None):
+    return iam.iter_scan(
+        collection=config.get('scanner.iam_collection', 'api'),
+        credentials=config.get('scanner.iam_credentials', 'api'),
+        policy_processes=config.get('scanner.policy_processes'),
+        state=state,
+        context=context or scan_context()
+    )
+
+
+def run_ec2(state, context=None):
+    return regional_scan(
+        'ec2', ec2.iter_scan, context,
+        verify_snapshots=config.get('scanner.verify_snapshots', False),
+        state=state
+    )
+
+
+def run_sg(state, context=None):
+    return regional_scan(
+        'sg', sg.iter_scan, context,
+        trusted=config.get('scanner.trusted_cidrs'),
+        reachability=config.get('scanner.sg_reachability', True)
+    )
+
+
+def run_organization(state, context=None):
+    # Each account gets a context of its own
+    return organization.iter_scan(
+        accounts=config.get('scanner.organization.accounts'),
+        ou=config.get('scanner.organization.ou'),
+        role_name=config.get(
+            'scanner.organization.role_name',
+            organization.DEFAULT_ROLE_NAME
+        ),
+        external_id=config.get('scanner.organization.external_id'),
+        region_names=config.get('scanner.regions'),
+        max_accounts=config.get(
+            'scanner.organization.max_accounts',
+            organization.DEFAULT_MAX_ACCOUNTS
+        ),
+        processes=config.get('scanner.organization.processes', 0),
+        options={
+            'iam': {
+                'collection': config.get('scanner.iam_collection', 'api'),
+                'credentials': config.get('scanner.iam_credentials', 'api')
+            },
+            'ec2': {
+                'verify_snapshots': config.get(
+                    'scanner.verify_snapshots', False
+                )
+            },
+            'sg': {
+                'trusted': config.get('scanner.trusted_cidrs'),
+                'reachability': config.get('scanner.sg_reachability', True)
+            }
+        },
+        clients=clients
+    )
+
+
+# json builds the whole response; ndjson and sse stream it
+Output = Literal['json', 'ndjson', 'sse']
+
+# Scanners by name, in the order a job runs them. Each takes the scan
+# state and, optionally, a context to share, and returns an iterator of
+# findings.
+SCANNERS = {
+    's3': run_s3,
+    'iam': run_iam,
+    'ec2': run_ec2,
+    'security-groups': run_sg,
+    'organization': run_organization,
+}
+DEFAULT_SCANNERS = ['s3', 'iam', 'ec2', 'security-groups']
+
+
+def run_now(name, compact, output='json'):
+    # Runs inside the request; large accounts should use POST /scans or
+    # a streaming format
+    if output in stream.FORMATS:
+        return stream_scan(name, compact, output)
+    with scan_state() as state:
+        results = list(SCANNERS[name](state))
     send_alerts(results)
-    return results
+    return serialize(results, compact)
+
+
+def stream_scan(name, compact, output):
+    alerts = Alerts()
+
+    def findings():
+        with scan_state() as state:
+            for finding in SCANNERS[name](state):
+                alerts.add(finding)
+                yield finding
+
+    def body():
+        # The last emails go out once 'done' has been sent, or the client
+        # has gone away
+        try:
+            yield from encode(stream.events(findings(), compact))
+        finally:
+            alerts.flush()
+
+    encode, media_type = stream.FORMATS[output]
+    return StreamingResponse(body(), media_type=media_type)
+
+
+@app.get("/scan/s3")
+def scan_s3(compact: bool = False,
+            output: Output = Query('json', alias='format'),
+            user: str = Depends(get_current_user)):
+    return run_now('s3', compact, output)
 
 
 @app.get("/scan/iam")
-def scan_iam(user: str = Depends(get_current_user)):
-    results = iam.scan()
-    send_alerts(results)
-    return results
+def scan_iam(compact: bool = False,
+             output: Output = Query('json', alias='format'),
+             user: str = Depends(get_current_user)):
+    return run_now('iam', compact, output)
 
 
 @app.get("/scan/ec2")
-def scan_ec2(user: str = Depends(get_current_user)):
-    results = ec2.scan()
-    send_alerts(results)
-    return results
+def scan_ec2(compact: bool = False,
+             output: Output = Query('json', alias='format'),
+             user: str = Depends(get_current_user)):
+    return run_now('ec2', compact, output)
 
 
 @app.get("/scan/security-groups")
-def scan_sg(user: str = Depends(get_current_user)):
-    results = sg.scan()
-    send_alerts(results)
-    return results
+def scan_sg(compact: bool = False,
+            output: Output = Query('json', alias='format'),
+            user: str = Depends(get_current_user)):
+    return run_now('security-groups', compact, output)
+
+
+@app.get("/scan/organization")
+def scan_organization(compact: bool = False,
+                      output: Output = Query('json', alias='format'),
+                      user: str = Depends(get_current_user)):
+    return run_now('organization', compact, output)
+
+
+class ScanRequest(BaseModel):
+    scanners: List[str] = DEFAULT_SCANNERS
+
+
+@app.post("/scans", status_code=status.HTTP_202_ACCEPTED)
+def submit_scan(request: Optional[ScanRequest] = None,
+                user: str = Depends(get_current_user)):
+    request = request or ScanRequest()
+    unknown = sorted(set(request.scanners) - set(SCANNERS))
+    if unknown or not request.scanners:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown scanners: {', '.join(unknown)}" if unknown
+            else "No scanners requested"
+        )
+    # Canonical order, so the same set of scanners is de-duplicated
+    names = [name for name in SCANNERS if name in request.scanners]
+    job = jobs.submit(
+        {name: job_scanner(SCANNERS[name]) for name in names},
+        scope=job_scope,
+        on_complete=send_alerts
+    )
+    return job.status()
+
+
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return job
+
+
+@app.get("/scans/{job_id}")
+def scan_status(job_id: str, user: str = Depends(get_current_user)):
+    return get_job(job_id).status()
+
+
+@app.get("/scans/{job_id}/results")
+def scan_results(job_id: str, compact: bool = False,
+                 user: str = Depends(get_current_user)):
+    job = get_job(job_id)
+    if not job.done:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Scan job is {job.state}"
+        )
+    return serialize(job.results, compact)
 
 
 @app.get("/report")
@@ -51,6 +296,52 @@ def report(user: str = Depends(get_current_user)):
     return generate_report()
 
 
+def serialize(results, compact=False):
+    # The compact form lists each rule's CIS text and remediation once
+    if compact:
+        return to_document(results)
+    return [r.as_dict() for r in results]
+
+
+# Findings of one risk level per alert email while a scan streams
+ALERT_BATCH = 100
+
+
+class Alerts:
+    """Alerts streamed findings as they pass instead of keeping them all.
+
+    HIGH and MEDIUM findings go to Slack one by one, and every risk level
+    is emailed in batches of ALERT_BATCH; flush() sends what is left.
+    """
+
+    def __init__(self, batch_size=ALERT_BATCH):
+        self.batch_size = batch_size
+        self.pending = {'HIGH': [], 'MEDIUM': [], 'LOW': []}
+        self._lock = threading.Lock()
+
+    def add(self, finding):
+        # Slack for high and medium risk findings; low risk ones are only
+        # emailed
+        if finding["risk"] in ("HIGH", "MEDIUM"):
+            send_slack_alert(finding, config.get('slack.webhook'))
+        with self._lock:
+            batch = self.pending.get(finding["risk"])
+            if batch is None:
+                return
+            batch.append(finding)
+            if len(batch) < self.batch_size:
+                return
+            self.pending[finding["risk"]] = []
+        send_email_alert(batch, config.get('email'))
+
+    def flush(self):
+        with self._lock:
+            batches = [b for b in self.pending.values() if b]
+            self.pending = {risk: [] for risk in self.pending}
+        for batch in batches:
+            send_email_alert(batch, config.get('email'))
+
+
 def send_alerts(results):
     # Group findings by risk level
     high_risk_findings = [r for r in results if r["risk"] == "HIGH"]
@@ -1,13 +1,13 @@
 from datetime import datetime
 
+from scanner.finding import to_document
+
 
 def generate_report(findings=None):
     if findings is None:
         findings = []
 
-    report = {
-        "timestamp": datetime.now().isoformat(),
-        "findings": findings
-    }
+    report = {"timestamp": datetime.now().isoformat()}
+    report.update(to_document(findings))
 
     return report
@@ -0,0 +1,118 @@
+"""
+Streaming scan output.
+
+Findings are sent to the client as soon as a scanner yields them, as
+NDJSON (one JSON object per line) or as Server-Sent Events. The scan
+runs on its own thread and hands findings over through a small queue,
+so a slow client holds the scan back instead of findings piling up in
+memory. A progress event follows every ``PROGRESS_EVERY`` findings, and
+a heartbeat goes out whenever the scan has been quiet for
+``HEARTBEAT_SECONDS`` so proxies keep the connection open.
+"""
+import json
+import queue
+import threading
+import time
+
+from scanner.finding import catalog
+
+PROGRESS_EVERY = 100
+HEARTBEAT_SECONDS = 15
+
+# Findings buffered between the scan thread and the response.
+STREAM_BUFFER = 100
+
+_DONE = object()
+
+
+def events(findings, compact=False, heartbeat=HEARTBEAT_SECONDS,
+           progress_every=PROGRESS_EVERY):
+    """Yield (event, data) pairs while ``findings`` is consumed.
+
+    Events are 'finding', 'progress', 'heartbeat', 'error' and finally
+    'done'. With ``compact`` findings use Finding.compact() and the
+    rule catalog of the rules seen is sent with 'done'. Closing the
+    generator stops the scan.
+    """
+    items = queue.Queue(maxsize=STREAM_BUFFER)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for finding in findings:
+                if not put(finding):
+                    break
+        except Exception as e:
+            print(f"Error streaming scan: {e}")
+            put(e)
+        finally:
+            close = getattr(findings, 'close', None)
+            if close is not None:
+                close()
+            put(_DONE)
+
+    start = time.monotonic()
+    count = 0
+    rule_ids = set()
+
+    def status():
+        return {
+            'findings': count,
+            'elapsed': round(time.monotonic() - start, 3)
+        }
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            try:
+                item = items.get(timeout=heartbeat)
+            except queue.Empty:
+                yield 'heartbeat', status()
+                continue
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                yield 'error', {'error': str(item)}
+                continue
+
+            count += 1
+            if compact:
+                rule_ids.add(item.rule_id)
+                yield 'finding', item.compact()
+            else:
+                yield 'finding', item.as_dict()
+            if count % progress_every == 0:
+                yield 'progress', status()
+
+        done = status()
+        if compact:
+            done['rules'] = catalog(rule_ids)
+        yield 'done', done
+    finally:
+        stop.set()
+
+
+def ndjson(events):
+    for event, data in events:
+        yield json.dumps({'event': event, 'data': data}, default=str) + '\n'
+
+
+def sse(events):
+    for event, data in events:
+        yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+# format -> (encoder, media type)
+FORMATS = {
+    'ndjson': (ndjson, 'application/x-ndjson'),
+    'sse': (sse, 'text/event-stream'),
+}
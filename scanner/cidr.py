@@ -0,0 +1,48 @@
+"""
+Prefix trie over IPv4 and IPv6 networks.
+
+Each stored prefix carries a label. Looking up a network walks at most
+one bit per prefix length, so classifying a rule costs O(prefix length)
+however many prefixes are stored.
+"""
+import ipaddress
+
+_CHILDREN, _LABEL = 0, 1
+
+
+class CidrTrie:
+    """Binary trie mapping CIDR prefixes to labels."""
+
+    def __init__(self, prefixes=()):
+        self._roots = {4: [[None, None], None], 6: [[None, None], None]}
+        for cidr, label in prefixes:
+            self.add(cidr, label)
+
+    @staticmethod
+    def _bits(network):
+        address = int(network.network_address)
+        width = network.max_prefixlen
+        for depth in range(network.prefixlen):
+            yield (address >> (width - depth - 1)) & 1
+
+    def add(self, cidr, label):
+        network = ipaddress.ip_network(cidr, strict=False)
+        node = self._roots[network.version]
+        for bit in self._bits(network):
+            if node[_CHILDREN][bit] is None:
+                node[_CHILDREN][bit] = [[None, None], None]
+            node = node[_CHILDREN][bit]
+        node[_LABEL] = label
+
+    def lookup(self, cidr):
+        """Label of the longest stored prefix containing ``cidr``."""
+        network = ipaddress.ip_network(cidr, strict=False)
+        node = self._roots[network.version]
+        label = node[_LABEL]
+        for bit in self._bits(network):
+            node = node[_CHILDREN][bit]
+            if node is None:
+                break
+            if node[_LABEL] is not None:
+                label = node[_LABEL]
+        return label
@@ -0,0 +1,66 @@
+"""
+Shared boto3 clients.
+
+A ClientFactory hands out one client per (account, region, service),
+built with a larger connection pool and standard retries, and paced by
+a shared RateLimiter (see ratelimit.py). The limiter already backs off
+on throttling, so botocore's adaptive mode, which keeps a rate limiter
+of its own, would only slow throttled calls down twice. boto3 clients
+are thread-safe once built, so scanner threads share them. Creation is
+serialized because the default boto3 session is not.
+
+boto3.client is looked up on every creation, so tests that patch it
+keep working with a fresh factory.
+"""
+import threading
+
+import boto3
+from botocore.config import Config
+from .ratelimit import RateLimiter
+
+DEFAULT_MAX_POOL_CONNECTIONS = 50
+DEFAULT_RETRY_MODE = 'standard'
+DEFAULT_MAX_ATTEMPTS = 10
+
+
+class ClientFactory:
+    """Caches boto3 clients per (account, region, service)."""
+
+    def __init__(self, max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS,
+                 retry_mode=DEFAULT_RETRY_MODE,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, rate_limiter=None):
+        self.rate_limiter = (
+            RateLimiter() if rate_limiter is None else rate_limiter
+        )
+        self.config = Config(
+            max_pool_connections=max(1, max_pool_connections),
+            retries={'mode': retry_mode, 'max_attempts': max_attempts}
+        )
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def client(self, service, region=None, credentials=None, account=None):
+        """Return the shared client, creating it on first use.
+
+        A client is rebuilt when the account's credentials change, e.g.
+        after an assumed role is renewed.
+        """
+        credentials = credentials or {}
+        key = (account, region, service)
+        access_key = credentials.get('aws_access_key_id')
+        with self._lock:
+            cached = self._clients.get(key)
+            if cached is None or cached[0] != access_key:
+                kwargs = dict(credentials, config=self.config)
+                if region:
+                    kwargs['region_name'] = region
+                client = self.rate_limiter.attach(
+                    boto3.client(service, **kwargs), region
+                )
+                cached = (access_key, client)
+                self._clients[key] = cached
+            return cached[1]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._clients)
@@ -0,0 +1,100 @@
+import copy
+import json
+import threading
+
+from .clients import ClientFactory
+from .pagination import paginate
+
+
+class ScanContext:
+    """State shared by every scanner during one audit run.
+
+    Clients come from ``clients``, a ClientFactory that may be shared
+    across runs, and are created once per (service, region). With
+    ``memoize`` on, the results of calls made with ``shared=True`` (the
+    inventory more than one scanner reads, such as the network
+    interfaces used by both EC2 and security groups) are kept by
+    operation and parameters, so those scanners share one set of calls.
+    Every other call, and every call without ``memoize``, streams
+    straight from the API page by page.
+    Calls go to ``region`` unless a region is given explicitly, and use
+    ``credentials`` (boto3 client keyword arguments) when scanning an
+    account other than the caller's own. ``credentials`` may also be a
+    callable returning them, asked on every client lookup so that
+    temporary credentials renewed mid-scan are picked up.
+    """
+
+    def __init__(self, memoize=True, region=None, credentials=None,
+                 account=None, clients=None):
+        self.memoize = memoize
+        self.region = region
+        self.credentials = credentials or {}
+        self.account = account
+        self.clients = ClientFactory() if clients is None else clients
+        self._results = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self.counts = {'hits': 0, 'misses': 0}
+
+    def for_region(self, region):
+        """A view of this context whose calls default to ``region``.
+
+        Clients, memoized results and counters stay shared.
+        """
+        regional = copy.copy(self)
+        regional.region = region
+        return regional
+
+    def current_credentials(self):
+        if callable(self.credentials):
+            return self.credentials()
+        return self.credentials
+
+    def client(self, service, region=None):
+        return self.clients.client(
+            service, region or self.region, self.current_credentials(),
+            self.account
+        )
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def items(self, service, operation, result_key, token_key='NextToken',
+              region=None, shared=False, **params):
+        """Iterate every item of a paginated call.
+
+        ``shared`` results are memoized when the context memoizes.
+        """
+        region = region or self.region
+        method = getattr(self.client(service, region), operation)
+        if not (self.memoize and shared):
+            return paginate(method, result_key, token_key, **params)
+
+        key = (service, region, operation, result_key,
+               json.dumps(params, sort_keys=True, default=str))
+        # Concurrent scanners asking for the same data wait for the first
+        # fetch instead of issuing their own.
+        with self._key_lock(key):
+            if key in self._results:
+                with self._lock:
+                    self.counts['hits'] += 1
+            else:
+                with self._lock:
+                    self.counts['misses'] += 1
+                self._results[key] = list(
+                    paginate(method, result_key, token_key, **params)
+                )
+        return iter(self._results[key])
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+def network_interfaces(context):
+    """Every ENI in the context's region, shared by EC2 and SG scans."""
+    return context.items(
+        'ec2', 'describe_network_interfaces', 'NetworkInterfaces',
+        shared=True, MaxResults=1000
+    )
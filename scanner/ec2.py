@@ -1,131 +1,285 @@
-import boto3
-from .rules import cis_rules
+from collections import defaultdict
 
+from .context import ScanContext, network_interfaces
+from .engine import RuleEngine, rule
 
-def scan():
-    findings = []
-    ec2 = boto3.client('ec2')
-    instances = ec2.describe_instances()
 
-    for reservation in instances['Reservations']:
+def _volume_index(context):
+    """Fetch every EBS volume in bulk and index it by volume ID."""
+    try:
+        return {
+            volume['VolumeId']: volume
+            for volume in context.items(
+                'ec2', 'describe_volumes', 'Volumes', MaxResults=500
+            )
+        }
+    except Exception as e:
+        print(f"Error listing volumes: {e}")
+        return {}
+
+
+def _interface_index(context):
+    """Map instance IDs to their ENIs from the shared ENI inventory."""
+    try:
+        index = defaultdict(list)
+        for eni in network_interfaces(context):
+            instance_id = eni.get('Attachment', {}).get('InstanceId')
+            if instance_id:
+                index[instance_id].append({
+                    'NetworkInterfaceId': eni['NetworkInterfaceId'],
+                    'Association': eni.get('Association', {}),
+                })
+        return index
+    except Exception as e:
+        print(f"Error listing network interfaces: {e}")
+        return None
+
+
+def _termination_protection(ec2, instance_id):
+    try:
+        attributes = ec2.describe_instance_attribute(
+            InstanceId=instance_id,
+            Attribute='disableApiTermination'
+        )
+        return attributes['DisableApiTermination']['Value']
+    except Exception as e:
+        print(
+            f"Error checking termination protection for "
+            f"{instance_id}: {e}"
+        )
+        return None
+
+
+def _cached_termination_protection(ec2, instance, state):
+    instance_id = instance['InstanceId']
+    if state is None:
+        return _termination_protection(ec2, instance_id)
+
+    digest, protected = state.lookup('ec2', instance_id, {
+        'LaunchTime': instance.get('LaunchTime'),
+        'State': instance.get('State', {}).get('Name'),
+    })
+    if protected is None:
+        protected = _termination_protection(ec2, instance_id)
+        if protected is not None:
+            state.save('ec2', instance_id, digest, protected)
+    return protected
+
+
+def _collect_instances(context, volumes, state=None, interfaces=None,
+                       **params):
+    # Instances missing from the ENI index (or without one) fall back to
+    # the interfaces describe_instances returns
+    ec2 = context.client('ec2')
+    for reservation in context.items(
+        'ec2', 'describe_instances', 'Reservations',
+        **(params or {'MaxResults': 1000})
+    ):
         for instance in reservation['Instances']:
             instance_id = instance['InstanceId']
+            yield 'ec2_instance', {
+                'InstanceId': instance_id,
+                'NetworkInterfaces': (
+                    (interfaces or {}).get(instance_id) or
+                    instance.get('NetworkInterfaces', [])
+                ),
+                'DisableApiTermination': _cached_termination_protection(
+                    ec2, instance, state
+                ),
+            }
 
-            # Check public IP
-            for iface in instance.get('NetworkInterfaces', []):
-                if iface.get('Association', {}).get('PublicIp'):
-                    findings.append({
-                        "resource": instance_id,
-                        "type": "EC2 Instance",
-                        "risk": (
-                            cis_rules["ec2_public_ip"]["risk_level"]
-                        ),
-                        "issue": "Instance has public IP",
-                        "cis_rule": (
-                            cis_rules["ec2_public_ip"]["cis_rule"]
-                        ),
-                        "remediation": (
-                            cis_rules["ec2_public_ip"]["remediation"]
+            # Join block devices against the bulk volume index
+            for block_device in instance.get('BlockDeviceMappings', []):
+                if 'Ebs' in block_device:
+                    volume_id = block_device['Ebs']['VolumeId']
+                    volume = volumes.get(volume_id)
+                    if volume is None:
+                        print(
+                            f"Error checking volume encryption for "
+                            f"{volume_id}: volume not found"
                         )
-                    })
+                    else:
+                        yield 'ec2_volume', dict(
+                            volume, InstanceId=instance_id
+                        )
+
+
+def _collect_unattached_volumes(volumes):
+    # Unattached volumes are never reached through an instance
+    for volume in volumes.values():
+        if volume.get('State') == 'available':
+            yield 'ec2_volume', volume
 
-            # Check termination protection
+
+def _collect_public_snapshots(context):
+    """Ask EC2 for owned snapshots that anyone can restore."""
+    try:
+        # The owner filter keeps the result to our own snapshots; on its
+        # own RestorableByUserIds=['all'] lists every public snapshot.
+        for snapshot in context.items(
+            'ec2', 'describe_snapshots', 'Snapshots',
+            OwnerIds=['self'], RestorableByUserIds=['all'], MaxResults=1000
+        ):
+            yield 'ec2_snapshot', dict(
+                snapshot, CreateVolumePermissions=[{'Group': 'all'}]
+            )
+    except Exception as e:
+        print(f"Error listing public snapshots: {e}")
+
+
+def _collect_snapshot_permissions(context, state=None, **params):
+    """Fetch the createVolumePermission of every owned snapshot."""
+    ec2 = context.client('ec2')
+    for snapshot in context.items(
+        'ec2', 'describe_snapshots', 'Snapshots',
+        **(params or {'OwnerIds': ['self'], 'MaxResults': 1000})
+    ):
+        snapshot_id = snapshot['SnapshotId']
+        permissions = None
+        if state is not None:
+            digest, permissions = state.lookup('ec2', snapshot_id, {
+                'StartTime': snapshot.get('StartTime'),
+                'State': snapshot.get('State'),
+            })
+        if permissions is None:
             try:
-                attributes = ec2.describe_instance_attribute(
-                    InstanceId=instance_id,
-                    Attribute='disableApiTermination'
+                attributes = ec2.describe_snapshot_attribute(
+                    SnapshotId=snapshot_id,
+                    Attribute='createVolumePermission'
                 )
-                if not attributes['DisableApiTermination']['Value']:
-                    findings.append({
-                        "resource": instance_id,
-                        "type": "EC2 Instance",
-                        "risk": (
-                            cis_rules["ec2_termination_protection"]
-                            ["risk_level"]
-                        ),
-                        "issue": (
-                            "Instance termination protection is not enabled"
-                        ),
-                        "cis_rule": (
-                            cis_rules["ec2_termination_protection"]
-                            ["cis_rule"]
-                        ),
-                        "remediation": (
-                            cis_rules["ec2_termination_protection"]
-                            ["remediation"]
-                        )
-                    })
             except Exception as e:
                 print(
-                    f"Error checking termination protection for "
-                    f"{instance_id}: {e}"
+                    f"Error checking snapshot permissions for "
+                    f"{snapshot_id}: {e}"
                 )
+                continue
+            permissions = attributes.get('CreateVolumePermissions', [])
+            if state is not None:
+                state.save('ec2', snapshot_id, digest, permissions)
+        yield 'ec2_snapshot', dict(
+            snapshot, CreateVolumePermissions=permissions
+        )
 
-            # Check volume encryption
-            for block_device in instance.get('BlockDeviceMappings', []):
-                if 'Ebs' in block_device:
-                    volume_id = block_device['Ebs']['VolumeId']
-                    try:
-                        volume = ec2.describe_volumes(
-                            VolumeIds=[volume_id]
-                        )['Volumes'][0]
-                        if not volume.get('Encrypted'):
-                            findings.append({
-                                "resource": (
-                                    f"{instance_id} - {volume_id}"
-                                ),
-                                "type": "EC2 Volume",
-                                "risk": (
-                                    cis_rules["ec2_unencrypted_volumes"]
-                                    ["risk_level"]
-                                ),
-                                "issue": "Volume is not encrypted",
-                                "cis_rule": (
-                                    cis_rules["ec2_unencrypted_volumes"]
-                                    ["cis_rule"]
-                                ),
-                                "remediation": (
-                                    cis_rules["ec2_unencrypted_volumes"]
-                                    ["remediation"]
-                                )
-                            })
-                    except Exception as e:
-                        print(
-                            f"Error checking volume encryption for "
-                            f"{volume_id}: {e}"
-                        )
 
-    # Check public snapshots
-    snapshots = ec2.describe_snapshots(OwnerIds=['self'])['Snapshots']
-    for snapshot in snapshots:
-        try:
-            attributes = ec2.describe_snapshot_attribute(
-                SnapshotId=snapshot['SnapshotId'],
-                Attribute='createVolumePermission'
-            )
-            for permission in attributes.get('CreateVolumePermissions', []):
-                if permission.get('Group') == 'all':
-                    findings.append({
-                        "resource": snapshot['SnapshotId'],
-                        "type": "EC2 Snapshot",
-                        "risk": (
-                            cis_rules["ec2_public_snapshot"]
-                            ["risk_level"]
-                        ),
-                        "issue": "Snapshot is publicly accessible",
-                        "cis_rule": (
-                            cis_rules["ec2_public_snapshot"]
-                            ["cis_rule"]
-                        ),
-                        "remediation": (
-                            cis_rules["ec2_public_snapshot"]
-                            ["remediation"]
-                        )
-                    })
-        except Exception as e:
-            print(
-                f"Error checking snapshot permissions for "
-                f"{snapshot['SnapshotId']}: {e}"
+def collect(verify_snapshots=False, context=None, state=None):
+    """Yield EC2 instance, volume and snapshot records.
+
+    With a StateStore, termination protection and snapshot permissions
+    are reused for instances and snapshots that have not changed.
+    With a memoizing context, public IPs come from the ENI inventory
+    the security group scanner reads too, so the two list network
+    interfaces once; otherwise describe_instances already has them.
+    """
+    context = context or ScanContext(memoize=False)
+    volumes = _volume_index(context)
+    interfaces = _interface_index(context) if context.memoize else None
+    yield from _collect_instances(context, volumes, state, interfaces)
+    yield from _collect_unattached_volumes(volumes)
+    if verify_snapshots:
+        yield from _collect_snapshot_permissions(context, state)
+    else:
+        yield from _collect_public_snapshots(context)
+    if state is not None:
+        state.commit()
+
+
+def _attached_volume(volume):
+    for attachment in volume.get('Attachments', []):
+        if attachment.get('InstanceId'):
+            return dict(volume, InstanceId=attachment['InstanceId'])
+    return volume
+
+
+def collect_resources(instance_ids=(), volume_ids=(), snapshot_ids=(),
+                      context=None):
+    """Yield records for specific instances, volumes and snapshots.
+
+    Snapshot permissions are always read from the snapshot attribute,
+    so a snapshot that was just made private is reported as such.
+    """
+    context = context or ScanContext(memoize=False)
+    # MaxResults cannot be combined with explicit IDs
+    if instance_ids:
+        volumes = {
+            volume['VolumeId']: volume
+            for volume in context.items(
+                'ec2', 'describe_volumes', 'Volumes',
+                Filters=[{
+                    'Name': 'attachment.instance-id',
+                    'Values': list(instance_ids)
+                }]
             )
+        }
+        yield from _collect_instances(
+            context, volumes, InstanceIds=list(instance_ids)
+        )
+    if volume_ids:
+        for volume in context.items(
+            'ec2', 'describe_volumes', 'Volumes', VolumeIds=list(volume_ids)
+        ):
+            yield 'ec2_volume', _attached_volume(volume)
+    if snapshot_ids:
+        yield from _collect_snapshot_permissions(
+            context, SnapshotIds=list(snapshot_ids)
+        )
+
+
+@rule("ec2_public_ip")
+def _public_ip(instance):
+    for iface in instance.get('NetworkInterfaces', []):
+        if iface.get('Association', {}).get('PublicIp'):
+            yield {
+                "resource": instance['InstanceId'],
+                "type": "EC2 Instance",
+                "issue": "Instance has public IP"
+            }
+
+
+@rule("ec2_termination_protection")
+def _termination_protection_disabled(instance):
+    if instance.get('DisableApiTermination') is False:
+        yield {
+            "resource": instance['InstanceId'],
+            "type": "EC2 Instance",
+            "issue": "Instance termination protection is not enabled"
+        }
+
+
+@rule("ec2_unencrypted_volumes")
+def _unencrypted_volume(volume):
+    if volume.get('Encrypted'):
+        return
+    if volume.get('InstanceId'):
+        yield {
+            "resource": f"{volume['InstanceId']} - {volume['VolumeId']}",
+            "type": "EC2 Volume",
+            "issue": "Volume is not encrypted"
+        }
+    else:
+        yield {
+            "resource": volume['VolumeId'],
+            "type": "EC2 Volume",
+            "issue": "Unattached volume is not encrypted"
+        }
+
+
+@rule("ec2_public_snapshot")
+def _public_snapshot(snapshot):
+    for permission in snapshot.get('CreateVolumePermissions', []):
+        if permission.get('Group') == 'all':
+            yield {
+                "resource": snapshot['SnapshotId'],
+                "type": "EC2 Snapshot",
+                "issue": "Snapshot is publicly accessible"
+            }
+
+
+def iter_scan(verify_snapshots=False, context=None, engine=None,
+              state=None):
+    """Yield findings as instances, volumes and snapshots are read."""
+    engine = engine or RuleEngine()
+    return engine.stream(collect(verify_snapshots, context, state))
+
 
-    return findings
+def scan(verify_snapshots=False, context=None, engine=None, state=None):
+    return list(iter_scan(verify_snapshots, context, engine, state))
@@ -0,0 +1,117 @@
+"""
+Rule engine.
+
+Scanners collect resources as (resource_type, record) pairs and register
+one predicate per rule in scanner.rules.cis_rules. Each rule's entry
+declares the resource type it applies to, so the engine evaluates every
+record against exactly the rules for its type in one pass and returns
+scanner.finding.Finding objects that refer back to the rule catalog.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from .finding import FIELDS, Finding
+from .rules import cis_rules
+
+# rule_id -> Rule, populated by the @rule decorator in each scanner.
+registry = {}
+
+
+class Rule:
+    def __init__(self, rule_id, predicate):
+        if rule_id not in cis_rules:
+            raise ValueError(f"Unknown rule: {rule_id}")
+        self.rule_id = rule_id
+        self.resource_type = cis_rules[rule_id]["resource_type"]
+        self.predicate = predicate
+
+
+def rule(rule_id):
+    """Register a predicate for a rule declared in scanner.rules.
+
+    The predicate receives one record of the rule's resource type and
+    yields partial findings: dicts with "resource", "type" and "issue",
+    optionally overriding "risk" or adding extra keys.
+    """
+    def decorator(predicate):
+        registry[rule_id] = Rule(rule_id, predicate)
+        return predicate
+    return decorator
+
+
+class RuleEngine:
+    """Evaluates collected resources against the registered rules."""
+
+    def __init__(self, rules=None):
+        self._rules = rules
+        self._by_type = None
+        self._lock = threading.Lock()
+        self._stats = defaultdict(
+            lambda: {'evaluated': 0, 'findings': 0, 'seconds': 0.0}
+        )
+
+    def rules_for(self, resource_type):
+        """Rules for a resource type, in rule catalog order."""
+        if self._by_type is None:
+            rules = self._rules if self._rules is not None else registry
+            by_type = defaultdict(list)
+            for rule_id in cis_rules:
+                if rule_id in rules:
+                    by_type[rules[rule_id].resource_type].append(
+                        rules[rule_id]
+                    )
+            self._by_type = by_type
+        return self._by_type.get(resource_type, [])
+
+    def evaluate(self, resource_type, record):
+        """Return the findings for one record."""
+        findings = []
+        for current in self.rules_for(resource_type):
+            started = time.perf_counter()
+            matches = list(current.predicate(record))
+            elapsed = time.perf_counter() - started
+
+            for match in matches:
+                extra = {
+                    key: value for key, value in match.items()
+                    if key not in FIELDS
+                }
+                findings.append(Finding(
+                    current.rule_id,
+                    match["resource"],
+                    match["type"],
+                    match["issue"],
+                    risk=match.get("risk"),
+                    extra=extra
+                ))
+
+            with self._lock:
+                stats = self._stats[current.rule_id]
+                stats['evaluated'] += 1
+                stats['findings'] += len(matches)
+                stats['seconds'] += elapsed
+        return findings
+
+    def stream(self, resources):
+        """Yield findings as (resource_type, record) pairs arrive."""
+        for resource_type, record in resources:
+            yield from self.evaluate(resource_type, record)
+
+    def run(self, resources):
+        """Evaluate an iterable of (resource_type, record) pairs."""
+        return list(self.stream(resources))
+
+    def stats(self):
+        """Per-rule evaluation counts, finding counts and time spent."""
+        with self._lock:
+            return {rule_id: dict(s) for rule_id, s in self._stats.items()}
+
+    def summary(self):
+        lines = []
+        for rule_id, s in sorted(self.stats().items()):
+            lines.append(
+                f"{rule_id}: {s['findings']} findings from "
+                f"{s['evaluated']} resources in {s['seconds'] * 1000:.1f} ms"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,296 @@
+"""
+Event-driven rescans.
+
+CloudTrail records, either from CloudTrail log files or wrapped in
+EventBridge "AWS API Call via CloudTrail" events, are mapped from their
+eventName to the resources the call changed. Only those resources are
+collected again and evaluated with the usual rules, so a change is
+re-checked with a handful of API calls instead of a full scan.
+
+    python -m scanner.events path/to/events
+"""
+import gzip
+import json
+import os
+import queue
+import sys
+from collections import OrderedDict
+
+from . import ec2, iam, s3, sg
+from .context import ScanContext
+from .engine import RuleEngine
+
+EVENT_SUFFIXES = ('.json', '.json.gz', '.jsonl', '.jsonl.gz')
+
+# Target kinds that live in a region; the rest (S3 buckets, which
+# resolve their own region, and IAM) are collected once globally.
+REGIONAL_KINDS = frozenset([
+    'security_group', 'ec2_instance', 'ec2_volume', 'ec2_snapshot'
+])
+
+
+def _path(section, *keys):
+    """Extractor for an ID nested under one section of a record."""
+    def extract(record):
+        value = record.get(section) or {}
+        for key in keys:
+            value = value.get(key) if isinstance(value, dict) else None
+        return [value] if isinstance(value, str) and value else []
+    return extract
+
+
+def _instance_set(record):
+    ids = []
+    for section in ('responseElements', 'requestParameters'):
+        items = ((record.get(section) or {})
+                 .get('instancesSet') or {}).get('items', [])
+        ids.extend(item['instanceId'] for item in items
+                   if item.get('instanceId'))
+    return ids
+
+
+def _account(record):
+    return ['account']
+
+
+def _request(*keys):
+    return _path('requestParameters', *keys)
+
+
+def _response(*keys):
+    return _path('responseElements', *keys)
+
+
+# eventName -> (target kind, extractor returning the affected IDs)
+EVENT_TARGETS = {
+    # S3
+    'CreateBucket': ('s3_bucket', _request('bucketName')),
+    'PutBucketAcl': ('s3_bucket', _request('bucketName')),
+    'PutBucketVersioning': ('s3_bucket', _request('bucketName')),
+    'PutBucketLogging': ('s3_bucket', _request('bucketName')),
+    'PutBucketEncryption': ('s3_bucket', _request('bucketName')),
+    'DeleteBucketEncryption': ('s3_bucket', _request('bucketName')),
+    # Security groups
+    'CreateSecurityGroup': ('security_group', _response('groupId')),
+    'AuthorizeSecurityGroupIngress': (
+        'security_group', _request('groupId')
+    ),
+    'RevokeSecurityGroupIngress': ('security_group', _request('groupId')),
+    'ModifySecurityGroupRules': (
+        'security_group',
+        _request('ModifySecurityGroupRulesRequest', 'GroupId')
+    ),
+    # EC2
+    'RunInstances': ('ec2_instance', _instance_set),
+    'StartInstances': ('ec2_instance', _instance_set),
+    'ModifyInstanceAttribute': ('ec2_instance', _request('instanceId')),
+    'AssociateAddress': ('ec2_instance', _request('instanceId')),
+    'CreateVolume': ('ec2_volume', _response('volumeId')),
+    'AttachVolume': ('ec2_volume', _request('volumeId')),
+    'DetachVolume': ('ec2_volume', _request('volumeId')),
+    'CreateSnapshot': ('ec2_snapshot', _response('snapshotId')),
+    'ModifySnapshotAttribute': ('ec2_snapshot', _request('snapshotId')),
+    'ResetSnapshotAttribute': ('ec2_snapshot', _request('snapshotId')),
+    # IAM
+    'CreateUser': ('iam_user', _request('userName')),
+    'AttachUserPolicy': ('iam_user', _request('userName')),
+    'DetachUserPolicy': ('iam_user', _request('userName')),
+    'PutUserPolicy': ('iam_user', _request('userName')),
+    'DeleteUserPolicy': ('iam_user', _request('userName')),
+    'CreateAccessKey': ('iam_user', _request('userName')),
+    'UpdateAccessKey': ('iam_user', _request('userName')),
+    'EnableMFADevice': ('iam_user', _request('userName')),
+    'DeactivateMFADevice': ('iam_user', _request('userName')),
+    'AttachGroupPolicy': ('iam_group', _request('groupName')),
+    'DetachGroupPolicy': ('iam_group', _request('groupName')),
+    'PutGroupPolicy': ('iam_group', _request('groupName')),
+    'DeleteGroupPolicy': ('iam_group', _request('groupName')),
+    'AttachRolePolicy': ('iam_role', _request('roleName')),
+    'DetachRolePolicy': ('iam_role', _request('roleName')),
+    'PutRolePolicy': ('iam_role', _request('roleName')),
+    'DeleteRolePolicy': ('iam_role', _request('roleName')),
+    'CreatePolicyVersion': ('iam_policy', _request('policyArn')),
+    'SetDefaultPolicyVersion': ('iam_policy', _request('policyArn')),
+    'UpdateAccountPasswordPolicy': ('iam_password_policy', _account),
+    'DeleteAccountPasswordPolicy': ('iam_password_policy', _account),
+}
+
+
+def cloudtrail_records(event):
+    """Yield the CloudTrail records in a log file or EventBridge event.
+
+    Bare records and lists of any of these are accepted too.
+    """
+    if isinstance(event, list):
+        for entry in event:
+            yield from cloudtrail_records(entry)
+    elif 'Records' in event:
+        yield from event['Records']
+    elif 'detail' in event:
+        yield event['detail']
+    elif 'eventName' in event:
+        yield event
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def iter_directory(directory):
+    """Yield CloudTrail records from every event file in a directory.
+
+    Files hold one JSON document (a CloudTrail log file or an event) or,
+    for .jsonl, one event per line.
+    """
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(EVENT_SUFFIXES):
+            continue
+        with _open(os.path.join(directory, name)) as event_file:
+            if '.jsonl' in name:
+                for line in event_file:
+                    if line.strip():
+                        yield from cloudtrail_records(json.loads(line))
+            else:
+                yield from cloudtrail_records(json.load(event_file))
+
+
+def iter_queue(events, timeout=None):
+    """Yield CloudTrail records from a queue.Queue until it runs dry.
+
+    A None item ends the stream explicitly.
+    """
+    while True:
+        try:
+            event = events.get(timeout=timeout)
+        except queue.Empty:
+            return
+        if event is None:
+            return
+        yield from cloudtrail_records(event)
+
+
+def affected_resources(records):
+    """Map records to {region: {target kind: [resource IDs]}}.
+
+    Regional resources are grouped by the record's awsRegion; global
+    ones, and records without a region, fall under None. Everything is
+    kept in first-seen order. Failed and read-only calls change nothing
+    and are skipped.
+    """
+    targets = OrderedDict()
+    for record in records:
+        if record.get('errorCode') or record.get('readOnly') is True:
+            continue
+        target = EVENT_TARGETS.get(record.get('eventName'))
+        if target is None:
+            continue
+        kind, extract = target
+        region = record.get('awsRegion') if kind in REGIONAL_KINDS else None
+        ids = targets.setdefault(region, OrderedDict()).setdefault(
+            kind, OrderedDict()
+        )
+        for resource_id in extract(record):
+            ids[resource_id] = None
+    return {
+        region: {kind: list(ids) for kind, ids in kinds.items() if ids}
+        for region, kinds in targets.items()
+        if any(kinds.values())
+    }
+
+
+def _guarded(name, records):
+    # A deleted resource makes its describe call fail; report and move on
+    try:
+        yield from records
+    except Exception as e:
+        print(f"Error rescanning {name}: {e}")
+
+
+def _collect_iam(targets, check_credentials, context):
+    principals = OrderedDict(
+        (('users', name), None) for name in targets.get('iam_user', [])
+    )
+    principals.update(
+        (('groups', name), None) for name in targets.get('iam_group', [])
+    )
+    principals.update(
+        (('roles', name), None) for name in targets.get('iam_role', [])
+    )
+    # A new default policy version affects everything it is attached to
+    for policy_arn in targets.get('iam_policy', []):
+        try:
+            entities = iam.policy_entities(policy_arn, context)
+        except Exception as e:
+            print(f"Error listing entities for {policy_arn}: {e}")
+            continue
+        for kind, names in entities.items():
+            principals.update(((kind, name), None) for name in names)
+
+    for kind, name in principals:
+        yield from _guarded(name, iam.collect_principals(
+            check_credentials=check_credentials, context=context,
+            **{kind: [name]}
+        ))
+    if 'iam_password_policy' in targets:
+        yield from iam.collect_principals(
+            password_policy=True, context=context
+        )
+
+
+def collect(targets, trusted=None, reachability=True, context=None,
+            check_credentials=True):
+    """Yield (resource_type, record) pairs for the affected resources.
+
+    ``targets`` is an affected_resources() mapping; each region's
+    resources are collected in that region. Each ID is collected on its
+    own, so a resource deleted since its event only fails its own
+    rescan.
+    """
+    context = context or ScanContext(memoize=False)
+    for region, kinds in targets.items():
+        regional = context.for_region(region) if region else context
+        yield from _collect_targets(
+            kinds, trusted, reachability, regional, check_credentials
+        )
+
+
+def _collect_targets(targets, trusted, reachability, context,
+                     check_credentials):
+    if targets.get('s3_bucket'):
+        yield from s3.collect(
+            max_workers=1, bucket_names=targets['s3_bucket'], context=context
+        )
+    for group_id in targets.get('security_group', []):
+        yield from _guarded(group_id, sg.collect(
+            trusted, reachability, context, group_ids=[group_id]
+        ))
+    for kind, key in (('ec2_instance', 'instance_ids'),
+                      ('ec2_volume', 'volume_ids'),
+                      ('ec2_snapshot', 'snapshot_ids')):
+        for resource_id in targets.get(kind, []):
+            yield from _guarded(resource_id, ec2.collect_resources(
+                context=context, **{key: [resource_id]}
+            ))
+    yield from _collect_iam(targets, check_credentials, context)
+
+
+def process(records, engine=None, **options):
+    """Re-evaluate the resources changed by ``records``."""
+    engine = engine or RuleEngine()
+    return engine.stream(collect(affected_resources(records), **options))
+
+
+def main(argv):
+    if len(argv) != 1:
+        print("Usage: python -m scanner.events DIRECTORY")
+        return 2
+
+    findings = process(iter_directory(argv[0]))
+    print(json.dumps([f.as_dict() for f in findings], indent=2, default=str))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,154 @@
+"""
+Compact findings.
+
+A Finding keeps only what differs between findings (resource, type,
+risk, issue and any extra keys) and refers to its rule by ID. The CIS
+text and remediation live once in scanner.rules.cis_rules. Findings
+still read like the original dicts, so alerting and reporting code can
+index them as before, and as_dict() gives a plain copy.
+"""
+import json
+import sys
+from collections.abc import Mapping
+
+from .rules import cis_rules
+
+FIELDS = ('resource', 'type', 'risk', 'issue', 'cis_rule', 'remediation')
+RULE_FIELDS = ('cis_rule', 'remediation')
+
+
+class Finding(Mapping):
+    """One rule match, readable as the legacy finding dict."""
+
+    __slots__ = ('resource', 'type', 'risk', 'issue', 'rule_id', 'extra')
+
+    def __init__(self, rule_id, resource, resource_type, issue, risk=None,
+                 extra=None):
+        if rule_id not in cis_rules:
+            raise ValueError(f"Unknown rule: {rule_id}")
+        self.rule_id = rule_id
+        self.resource = resource
+        # Types, risks and issues repeat across findings; share the strings
+        self.type = sys.intern(resource_type)
+        self.risk = sys.intern(risk or cis_rules[rule_id]['risk_level'])
+        self.issue = sys.intern(issue)
+        self.extra = extra or None
+
+    def __getitem__(self, key):
+        if key in RULE_FIELDS:
+            return cis_rules[self.rule_id][key]
+        if key in FIELDS:
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        yield from FIELDS
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return len(FIELDS) + len(self.extra or ())
+
+    def __repr__(self):
+        return (f"Finding({self.rule_id!r}, {self.resource!r}, "
+                f"{self.type!r}, {self.issue!r}, risk={self.risk!r})")
+
+    def tag(self, **tags):
+        """Add extra keys such as the region, returning the finding."""
+        self.extra = dict(self.extra or {}, **tags)
+        return self
+
+    def as_dict(self):
+        """The legacy dict shape, with the rule text copied in."""
+        return dict(self)
+
+    # Lets code written against dict findings keep calling .copy()
+    copy = as_dict
+
+    def compact(self):
+        """A dict that points at the rule catalog by ID."""
+        compact = {
+            'resource': self.resource,
+            'type': self.type,
+            'risk': self.risk,
+            'issue': self.issue,
+            'rule': self.rule_id
+        }
+        if self.extra:
+            compact.update(self.extra)
+        return compact
+
+
+def rule_catalog(findings):
+    """The catalog entries of every rule referenced by ``findings``."""
+    return catalog({finding.rule_id for finding in findings})
+
+
+def catalog(rule_ids):
+    """The catalog entries of the given rule IDs."""
+    return {
+        rule_id: {
+            'cis_rule': cis_rules[rule_id]['cis_rule'],
+            'risk_level': cis_rules[rule_id]['risk_level'],
+            'remediation': cis_rules[rule_id]['remediation']
+        }
+        for rule_id in cis_rules
+        if rule_id in rule_ids
+    }
+
+
+def to_document(findings):
+    """Serialize findings with the rule catalog emitted once."""
+    findings = list(findings)
+    return {
+        'rules': rule_catalog(findings),
+        'findings': [finding.compact() for finding in findings]
+    }
+
+
+def write_document(findings, fp, transform=None):
+    """Stream findings to ``fp`` in the to_document() JSON shape.
+
+    Findings are written one per line as they arrive and the rule
+    catalog follows them, so only the rule IDs seen are kept in memory.
+    ``transform(finding, compact)`` may rewrite each compact dict before
+    it is written. Returns the number of findings written.
+    """
+    rule_ids = set()
+    count = 0
+    fp.write('{"findings": [')
+    for finding in findings:
+        rule_ids.add(finding.rule_id)
+        compact = finding.compact()
+        if transform is not None:
+            compact = transform(finding, compact)
+        fp.write(',\n' if count else '\n')
+        fp.write(json.dumps(compact, default=str))
+        count += 1
+    fp.write('\n],\n"rules": ')
+    json.dump(catalog(rule_ids), fp, indent=2)
+    fp.write('}\n')
+    return count
+
+
+def from_document(document):
+    """Expand a to_document() result back into legacy finding dicts."""
+    rules = document['rules']
+    findings = []
+    for compact in document['findings']:
+        rule = rules[compact['rule']]
+        finding = {
+            'resource': compact['resource'],
+            'type': compact['type'],
+            'risk': compact['risk'],
+            'issue': compact['issue'],
+            'cis_rule': rule['cis_rule'],
+            'remediation': rule['remediation']
+        }
+        for key, value in compact.items():
+            if key != 'rule':
+                finding.setdefault(key, value)
+        findings.append(finding)
+    return findings
@@ -1,167 +1,554 @@
-import boto3
+import csv
+import io
+import threading
+import time
+from datetime import datetime, timezone
+
 from botocore.exceptions import ClientError
-from .rules import cis_rules
+from . import policy
+from .context import ScanContext
+from .engine import RuleEngine, rule
+from .pagination import paginate, paginate_pages
 
+# How principals and their policy documents are collected:
+#   api  - list users and fetch every policy document per user
+#   bulk - one paginated get_account_authorization_details snapshot
+COLLECTION_MODES = ('api', 'bulk')
 
-def scan():
-    findings = []
-    iam = boto3.client('iam')
+# Where MFA and access-key state comes from:
+#   api    - list_mfa_devices and list_access_keys per user
+#   report - a single IAM credential report for the whole account
+CREDENTIAL_SOURCES = ('api', 'report')
 
-    # --- Scan IAM Users ---
-    users = iam.list_users()['Users']
-    for user in users:
-        user_name = user['UserName']
+ROOT_ACCOUNT = '<root_account>'
+KEY_ROTATION_DAYS = 90
+REPORT_POLL_SECONDS = 2
+REPORT_TIMEOUT_SECONDS = 120
 
-        # Check for MFA
-        mfa_devices = iam.list_mfa_devices(UserName=user_name)['MFADevices']
-        if not mfa_devices:
-            findings.append({
-                "resource": user_name,
-                "type": "IAM User",
-                "risk": (
-                    cis_rules["iam_user_without_mfa"]["risk_level"]
-                ),
-                "issue": "User does not have MFA enabled",
-                "cis_rule": (
-                    cis_rules["iam_user_without_mfa"]["cis_rule"]
-                ),
-                "remediation": (
-                    cis_rules["iam_user_without_mfa"]["remediation"]
-                )
-            })
 
-        # Check access keys
-        access_keys = iam.list_access_keys(
-            UserName=user_name
-        )['AccessKeyMetadata']
-        for key in access_keys:
-            if key['Status'] == 'Active':
-                findings.append({
-                    "resource": (
-                        f"{user_name} - {key['AccessKeyId']}"
-                    ),
-                    "type": "IAM Access Key",
-                    "risk": (
-                        cis_rules["iam_root_access_key"]["risk_level"]
-                    ),
-                    "issue": "Active access key found",
-                    "cis_rule": (
-                        cis_rules["iam_root_access_key"]["cis_rule"]
-                    ),
-                    "remediation": (
-                        cis_rules["iam_root_access_key"]["remediation"]
-                    )
-                })
-
-        # Inline policies
-        inline_policies = iam.list_user_policies(
-            UserName=user_name
+class PolicyCache:
+    """Scan-scoped cache of managed policy documents.
+
+    Documents are keyed by (PolicyArn, DefaultVersionId), so each
+    distinct policy is fetched once no matter how many principals it is
+    attached to. Verdicts are cached by scanner.policy; the hits and
+    misses counted here are this scan's own.
+    """
+
+    def __init__(self):
+        self._default_versions = {}
+        self._documents = {}
+        self._lock = threading.Lock()
+        self.counts = {'document_hits': 0, 'document_misses': 0}
+        self.verdict_counts = {'verdict_hits': 0, 'verdict_misses': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def remember_versions(self, versions):
+        """Seed default version IDs, e.g. from a list_policies walk."""
+        self._default_versions.update(versions)
+
+    def document(self, iam, policy_arn):
+        """Return the default version document of a managed policy."""
+        version_id = self._default_versions.get(policy_arn)
+        if version_id is None:
+            managed = iam.get_policy(PolicyArn=policy_arn)
+            version_id = managed['Policy']['DefaultVersionId']
+            self._default_versions[policy_arn] = version_id
+
+        key = (policy_arn, version_id)
+        if key in self._documents:
+            self._count('document_hits')
+            return self._documents[key]
+
+        self._count('document_misses')
+        policy_doc = iam.get_policy_version(
+            PolicyArn=policy_arn,
+            VersionId=version_id
+        )['PolicyVersion']['Document']
+        self._documents[key] = policy_doc
+        return policy_doc
+
+    def verdict(self, policy_doc):
+        """Analyze a document ahead of the rules, counting cache use."""
+        return policy.analyze(policy_doc, counts=self.verdict_counts)
+
+    def analyze_documents(self, documents, processes=None):
+        return policy.analyze_documents(
+            documents, processes, counts=self.verdict_counts
+        )
+
+    def stats(self):
+        """Document and verdict cache hits and misses for this scan."""
+        with self._lock:
+            counts = dict(self.counts)
+        counts.update(self.verdict_counts)
+        return counts
+
+    def summary(self):
+        s = self.stats()
+        return (
+            f"IAM policy documents: {s['document_hits']} hits, "
+            f"{s['document_misses']} misses; verdicts: "
+            f"{s['verdict_hits']} hits, {s['verdict_misses']} misses"
+        )
+
+
+def _api_credentials(iam, user_name):
+    mfa_devices = iam.list_mfa_devices(UserName=user_name)['MFADevices']
+    access_keys = iam.list_access_keys(
+        UserName=user_name
+    )['AccessKeyMetadata']
+    return {
+        'UserName': user_name,
+        'IsRoot': False,
+        'MFAActive': bool(mfa_devices),
+        # A key's creation date is what the credential report calls its
+        # last rotation
+        'AccessKeys': [
+            {
+                'Label': key['AccessKeyId'],
+                'Active': key['Status'] == 'Active',
+                'LastRotated': key.get('CreateDate')
+            }
+            for key in access_keys
+        ]
+    }
+
+
+def _wait_for_credential_report(iam):
+    deadline = time.monotonic() + REPORT_TIMEOUT_SECONDS
+    while iam.generate_credential_report()['State'] != 'COMPLETE':
+        if time.monotonic() > deadline:
+            raise TimeoutError("Credential report was not generated in time")
+        time.sleep(REPORT_POLL_SECONDS)
+
+
+def iter_credential_report(iam):
+    """Generate the IAM credential report and yield one dict per user."""
+    _wait_for_credential_report(iam)
+    content = iam.get_credential_report()['Content']
+    # Rows are decoded and parsed one at a time rather than all at once.
+    with io.TextIOWrapper(io.BytesIO(content), encoding='utf-8') as report:
+        yield from csv.DictReader(report)
+
+
+def _report_date(value):
+    if isinstance(value, datetime):
+        return value
+    if not value or value in ('N/A', 'not_supported', 'no_information'):
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _report_credentials(row):
+    return {
+        'UserName': row['user'],
+        'IsRoot': row['user'] == ROOT_ACCOUNT,
+        'MFAActive': row.get('mfa_active') == 'true',
+        'AccessKeys': [
+            {
+                'Label': f'access_key_{n}',
+                'Active': row.get(f'access_key_{n}_active') == 'true',
+                'LastRotated': row.get(f'access_key_{n}_last_rotated')
+            }
+            for n in (1, 2)
+        ]
+    }
+
+
+# Per principal type: name parameter, inline list/get and attached list.
+PRINCIPAL_CALLS = {
+    'IAM User': ('UserName', 'list_user_policies', 'get_user_policy',
+                 'list_attached_user_policies'),
+    'IAM Group': ('GroupName', 'list_group_policies', 'get_group_policy',
+                  'list_attached_group_policies'),
+    'IAM Role': ('RoleName', 'list_role_policies', 'get_role_policy',
+                 'list_attached_role_policies'),
+}
+
+
+def _inline_policies(iam, principal_type, name, policy_names=None):
+    name_key, list_inline, get_inline, _ = PRINCIPAL_CALLS[principal_type]
+    if policy_names is None:
+        policy_names = getattr(iam, list_inline)(
+            **{name_key: name}
         )['PolicyNames']
-        for policy_name in inline_policies:
-            policy_doc = iam.get_user_policy(
-                UserName=user_name,
-                PolicyName=policy_name
-            )['PolicyDocument']
-            statements = policy_doc.get('Statement', [])
-            if isinstance(statements, dict):
-                statements = [statements]
-            for stmt in statements:
-                if (stmt.get('Effect') == 'Allow' and
-                        stmt.get('Action') == '*' and
-                        stmt.get('Resource') == '*'):
-                    findings.append({
-                        "resource": user_name,
-                        "type": "IAM User",
-                        "risk": (
-                            cis_rules["iam_policy_overly_permissive"]
-                            ["risk_level"]
-                        ),
-                        "issue": "Inline policy is overly permissive",
-                        "cis_rule": (
-                            cis_rules["iam_policy_overly_permissive"]
-                            ["cis_rule"]
-                        ),
-                        "remediation": (
-                            cis_rules["iam_policy_overly_permissive"]
-                            ["remediation"]
-                        )
-                    })
-
-        # Attached managed policies
-        attached_policies = iam.list_attached_user_policies(
-            UserName=user_name
+    for policy_name in policy_names:
+        policy_doc = getattr(iam, get_inline)(
+            PolicyName=policy_name,
+            **{name_key: name}
+        )['PolicyDocument']
+        yield {'PolicyName': policy_name, 'PolicyDocument': policy_doc}
+
+
+def _attached_policies(iam, principal_type, name, cache, attached=None):
+    name_key, _, _, list_attached = PRINCIPAL_CALLS[principal_type]
+    if attached is None:
+        attached = getattr(iam, list_attached)(
+            **{name_key: name}
         )['AttachedPolicies']
-        for attached_policy in attached_policies:
-            policy_arn = attached_policy['PolicyArn']
-            policy = iam.get_policy(PolicyArn=policy_arn)
-            version_id = policy['Policy']['DefaultVersionId']
-            policy_doc = iam.get_policy_version(
-                PolicyArn=policy_arn,
-                VersionId=version_id
-            )['PolicyVersion']['Document']
-            statements = policy_doc.get('Statement', [])
-            if isinstance(statements, dict):
-                statements = [statements]
-            for stmt in statements:
-                if (stmt.get('Effect') == 'Allow' and
-                        stmt.get('Action') == '*' and
-                        stmt.get('Resource') == '*'):
-                    findings.append({
-                        "resource": user_name,
-                        "type": "IAM User",
-                        "risk": (
-                            cis_rules["iam_policy_overly_permissive"]
-                            ["risk_level"]
-                        ),
-                        "issue": (
-                            f"Attached policy {attached_policy['PolicyName']} "
-                            "is overly permissive"
-                        ),
-                        "cis_rule": (
-                            cis_rules["iam_policy_overly_permissive"]
-                            ["cis_rule"]
-                        ),
-                        "remediation": (
-                            cis_rules["iam_policy_overly_permissive"]
-                            ["remediation"]
-                        )
-                    })
-
-    # Check password policy
+    for attached_policy in attached:
+        yield {
+            'PolicyName': attached_policy['PolicyName'],
+            'PolicyDocument': cache.document(
+                iam, attached_policy['PolicyArn']
+            )
+        }
+
+
+def _api_principal(iam, principal_type, name, cache, policy_names=None,
+                   attached=None):
+    """Build a principal record, listing its policies unless given."""
+    principal = {
+        'Name': name,
+        'Type': principal_type,
+        'InlinePolicies': list(
+            _inline_policies(iam, principal_type, name, policy_names)
+        ),
+        'AttachedPolicies': list(
+            _attached_policies(iam, principal_type, name, cache, attached)
+        )
+    }
+    # Warm the verdict cache so this scan's hits and misses are counted
+    for entry in principal['InlinePolicies'] + principal['AttachedPolicies']:
+        cache.verdict(entry['PolicyDocument'])
+    return principal
+
+
+def attached_policy_versions(iam):
+    """Map every attached managed policy's ARN to its default version."""
+    return {
+        managed['Arn']: managed['DefaultVersionId']
+        for managed in paginate(
+            iam.list_policies, 'Policies', token_key='Marker',
+            Scope='All', OnlyAttached=True
+        )
+    }
+
+
+def _user_metadata(user, attached, versions):
+    """Fingerprint inputs: the user plus its managed policy versions.
+
+    Attaching or detaching a policy, or publishing a new default
+    version, changes the fingerprint.
+    """
+    return {
+        'UserId': user.get('UserId'),
+        'CreateDate': user.get('CreateDate'),
+        'AttachedPolicies': sorted(
+            (entry['PolicyArn'], versions.get(entry['PolicyArn']))
+            for entry in attached
+        ),
+    }
+
+
+def _collect_users_api(iam, cache, check_credentials=True, state=None):
+    versions = None
+    if state is not None:
+        versions = attached_policy_versions(iam)
+        cache.remember_versions(versions)
+    for user in paginate(iam.list_users, 'Users', token_key='Marker'):
+        user_name = user['UserName']
+        # MFA devices and access keys change without touching the user,
+        # so credentials are always read fresh
+        if check_credentials:
+            yield 'iam_credentials', _api_credentials(iam, user_name)
+
+        if state is None:
+            yield 'iam_principal', _api_principal(
+                iam, 'IAM User', user_name, cache
+            )
+            continue
+
+        policy_names = list(paginate(
+            iam.list_user_policies, 'PolicyNames', token_key='Marker',
+            UserName=user_name
+        ))
+        attached = list(paginate(
+            iam.list_attached_user_policies, 'AttachedPolicies',
+            token_key='Marker', UserName=user_name
+        ))
+        # Inline documents can be rewritten in place without any list
+        # showing it, so users with inline policies are always rebuilt
+        reusable = not policy_names
+        if reusable:
+            digest, record = state.lookup(
+                'iam', user_name, _user_metadata(user, attached, versions)
+            )
+            if record is not None:
+                yield 'iam_principal', record
+                continue
+
+        record = _api_principal(
+            iam, 'IAM User', user_name, cache, policy_names, attached
+        )
+        if reusable:
+            state.save('iam', user_name, digest, record)
+        yield 'iam_principal', record
+
+
+def collect_authorization_details(iam):
+    """Snapshot users, groups, roles and policies in a few bulk pages.
+
+    Managed policies are reduced to their default version document,
+    keyed by ARN, so principals can be evaluated without further calls.
+    """
+    details = {'users': [], 'groups': {}, 'roles': [], 'policies': {}}
+    for page in paginate_pages(
+        iam.get_account_authorization_details, 'Marker'
+    ):
+        details['users'].extend(page.get('UserDetailList', []))
+        details['roles'].extend(page.get('RoleDetailList', []))
+        for group in page.get('GroupDetailList', []):
+            details['groups'][group['GroupName']] = group
+        for managed in page.get('Policies', []):
+            for version in managed.get('PolicyVersionList', []):
+                if version.get('IsDefaultVersion'):
+                    details['policies'][managed['Arn']] = version['Document']
+    return details
+
+
+def _detail_principal(name, principal_type, detail, list_key, policies):
+    """Build a principal record from an authorization detail entry."""
+    return {
+        'Name': name,
+        'Type': principal_type,
+        'InlinePolicies': [
+            {
+                'PolicyName': entry['PolicyName'],
+                'PolicyDocument': entry['PolicyDocument']
+            }
+            for entry in detail.get(list_key, [])
+        ],
+        'AttachedPolicies': [
+            {
+                'PolicyName': entry['PolicyName'],
+                'PolicyDocument': policies[entry['PolicyArn']]
+            }
+            for entry in detail.get('AttachedManagedPolicies', [])
+            if entry['PolicyArn'] in policies
+        ]
+    }
+
+
+def _detail_documents(details):
+    yield from details['policies'].values()
+    for entries, list_key in ((details['users'], 'UserPolicyList'),
+                              (details['groups'].values(), 'GroupPolicyList'),
+                              (details['roles'], 'RolePolicyList')):
+        for detail in entries:
+            for inline_policy in detail.get(list_key, []):
+                yield inline_policy['PolicyDocument']
+
+
+def _collect_users_bulk(iam, cache, check_credentials=True,
+                        processes=None):
+    details = collect_authorization_details(iam)
+    policies = details['policies']
+
+    # Every document is known up front, so analyze them as one batch.
+    cache.analyze_documents(_detail_documents(details), processes=processes)
+
+    for user in details['users']:
+        user_name = user['UserName']
+        if check_credentials:
+            yield 'iam_credentials', _api_credentials(iam, user_name)
+        yield 'iam_principal', _detail_principal(
+            user_name, 'IAM User', user, 'UserPolicyList', policies
+        )
+
+    for group_name, group in details['groups'].items():
+        yield 'iam_principal', _detail_principal(
+            group_name, 'IAM Group', group, 'GroupPolicyList', policies
+        )
+
+    for role in details['roles']:
+        yield 'iam_principal', _detail_principal(
+            role['RoleName'], 'IAM Role', role, 'RolePolicyList', policies
+        )
+
+
+def _collect_password_policy(iam):
     try:
         password_policy = iam.get_account_password_policy()['PasswordPolicy']
-        if not password_policy.get('RequireUppercaseCharacters'):
-            findings.append({
-                "resource": "IAM Password Policy",
-                "type": "IAM Policy",
-                "risk": (
-                    cis_rules["iam_password_policy"]["risk_level"]
-                ),
-                "issue": "Password policy does not require uppercase letters",
-                "cis_rule": (
-                    cis_rules["iam_password_policy"]["cis_rule"]
-                ),
-                "remediation": (
-                    cis_rules["iam_password_policy"]["remediation"]
-                )
-            })
     except ClientError as e:
-        if e.response['Error']['Code'] == 'NoSuchEntity':
-            findings.append({
-                "resource": "IAM Password Policy",
-                "type": "IAM Policy",
-                "risk": (
-                    cis_rules["iam_password_policy"]["risk_level"]
-                ),
-                "issue": "No password policy found",
-                "cis_rule": (
-                    cis_rules["iam_password_policy"]["cis_rule"]
-                ),
-                "remediation": (
-                    cis_rules["iam_password_policy"]["remediation"]
+        if e.response['Error']['Code'] != 'NoSuchEntity':
+            print(f"Error checking password policy: {e}")
+            return
+        password_policy = None
+    yield 'iam_password_policy', {'PasswordPolicy': password_policy}
+
+
+def collect(collection='api', credentials='api', policy_processes=None,
+            state=None, context=None, policy_cache=None):
+    """Yield IAM credential, principal and password policy records.
+
+    With a StateStore, users collected through the API whose managed
+    policies and policy versions are unchanged, and who have no inline
+    policies, reuse their principal record from the previous scan;
+    credentials and inline policies are always read fresh. ``context``
+    supplies the client, e.g. for another account. Pass ``policy_cache``
+    to read its stats() once the scan is done.
+    """
+    if collection not in COLLECTION_MODES:
+        raise ValueError(f"Unknown IAM collection mode: {collection}")
+    if credentials not in CREDENTIAL_SOURCES:
+        raise ValueError(f"Unknown IAM credential source: {credentials}")
+
+    iam = (context or ScanContext(memoize=False)).client('iam')
+    cache = PolicyCache() if policy_cache is None else policy_cache
+    per_user_credentials = credentials == 'api'
+
+    # --- IAM credentials from the credential report ---
+    if not per_user_credentials:
+        for row in iter_credential_report(iam):
+            yield 'iam_credentials', _report_credentials(row)
+
+    # --- IAM principals ---
+    if collection == 'bulk':
+        yield from _collect_users_bulk(
+            iam, cache, per_user_credentials, policy_processes
+        )
+    else:
+        yield from _collect_users_api(
+            iam, cache, per_user_credentials, state
+        )
+        if state is not None:
+            state.commit()
+
+    yield from _collect_password_policy(iam)
+
+
+def policy_entities(policy_arn, context=None):
+    """Return the users, groups and roles a managed policy is attached to."""
+    iam = (context or ScanContext(memoize=False)).client('iam')
+    entities = {'users': [], 'groups': [], 'roles': []}
+    for page in paginate_pages(
+        iam.list_entities_for_policy, 'Marker', PolicyArn=policy_arn
+    ):
+        entities['users'].extend(
+            user['UserName'] for user in page.get('PolicyUsers', [])
+        )
+        entities['groups'].extend(
+            group['GroupName'] for group in page.get('PolicyGroups', [])
+        )
+        entities['roles'].extend(
+            role['RoleName'] for role in page.get('PolicyRoles', [])
+        )
+    return entities
+
+
+def collect_principals(users=(), groups=(), roles=(), password_policy=False,
+                       check_credentials=True, context=None):
+    """Yield records for specific principals through the IAM API."""
+    iam = (context or ScanContext(memoize=False)).client('iam')
+    cache = PolicyCache()
+    for user_name in users:
+        if check_credentials:
+            yield 'iam_credentials', _api_credentials(iam, user_name)
+        yield 'iam_principal', _api_principal(
+            iam, 'IAM User', user_name, cache
+        )
+    for group_name in groups:
+        yield 'iam_principal', _api_principal(
+            iam, 'IAM Group', group_name, cache
+        )
+    for role_name in roles:
+        yield 'iam_principal', _api_principal(
+            iam, 'IAM Role', role_name, cache
+        )
+    if password_policy:
+        yield from _collect_password_policy(iam)
+
+
+@rule("iam_policy_overly_permissive")
+def _overly_permissive(principal):
+    for entry in principal['InlinePolicies']:
+        for _ in policy.analyze(entry['PolicyDocument']):
+            yield {
+                "resource": principal['Name'],
+                "type": principal['Type'],
+                "issue": "Inline policy is overly permissive"
+            }
+    for entry in principal['AttachedPolicies']:
+        for _ in policy.analyze(entry['PolicyDocument']):
+            yield {
+                "resource": principal['Name'],
+                "type": principal['Type'],
+                "issue": (
+                    f"Attached policy {entry['PolicyName']} "
+                    "is overly permissive"
                 )
-            })
+            }
+
+
+@rule("iam_user_without_mfa")
+def _user_without_mfa(user):
+    if user['MFAActive']:
+        return
+    yield {
+        "resource": user['UserName'],
+        "type": "IAM User",
+        "issue": ("Root account does not have MFA enabled" if user['IsRoot']
+                  else "User does not have MFA enabled")
+    }
+
+
+@rule("iam_root_access_key")
+def _active_access_key(user):
+    now = datetime.now(timezone.utc)
+    for key in user['AccessKeys']:
+        if not key['Active']:
+            continue
+        last_rotated = _report_date(key['LastRotated'])
+        if user['IsRoot']:
+            issue = "Root account has an active access key"
+        elif key['LastRotated'] is None:
+            issue = "Active access key found"
+        elif (last_rotated is not None and
+                (now - last_rotated).days > KEY_ROTATION_DAYS):
+            issue = f"Access key not rotated in {KEY_ROTATION_DAYS} days"
         else:
-            print(f"Error checking password policy: {e}")
+            continue
+        yield {
+            "resource": f"{user['UserName']} - {key['Label']}",
+            "type": "IAM Access Key",
+            "issue": issue
+        }
+
+
+@rule("iam_password_policy")
+def _password_policy(record):
+    password_policy = record['PasswordPolicy']
+    if password_policy is None:
+        issue = "No password policy found"
+    elif not password_policy.get('RequireUppercaseCharacters'):
+        issue = "Password policy does not require uppercase letters"
+    else:
+        return
+    yield {
+        "resource": "IAM Password Policy",
+        "type": "IAM Policy",
+        "issue": issue
+    }
+
+
+def iter_scan(collection='api', credentials='api', policy_processes=None,
+              engine=None, state=None, context=None, policy_cache=None):
+    """Yield findings as each principal is collected."""
+    engine = engine or RuleEngine()
+    return engine.stream(collect(
+        collection, credentials, policy_processes, state, context,
+        policy_cache
+    ))
+
 
-    return findings
+def scan(collection='api', credentials='api', policy_processes=None,
+         engine=None, state=None, context=None, policy_cache=None):
+    return list(iter_scan(
+        collection, credentials, policy_processes, engine, state, context,
+        policy_cache
+    ))
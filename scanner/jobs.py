@@ -0,0 +1,203 @@
+"""
+Background scan jobs.
+
+A job runs one or more named scanners in turn on a bounded pool of
+worker threads, so an API request only has to submit it and hand back
+its ID. Status, progress and per-scanner timings can be polled while it
+runs, with the running scanner's findings counted as they come in, and
+its findings fetched once it is done. Submitting the same
+scanners again while a job for them is still queued or running returns
+that job instead of starting another.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timezone
+
+# Jobs run at once; the rest wait in the executor's queue.
+DEFAULT_MAX_JOBS = 2
+
+# Finished jobs kept for status and results, oldest dropped first.
+DEFAULT_MAX_FINISHED = 50
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+class Job:
+    """One submitted scan and everything known about its progress."""
+
+    def __init__(self, key, scanners):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.state = QUEUED
+        self.created_at = _now()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.results = []
+        self.scanners = OrderedDict(
+            (name, {'status': 'pending', 'seconds': None, 'findings': 0,
+                    'error': None})
+            for name in scanners
+        )
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self.state in (COMPLETED, FAILED)
+
+    def progress(self):
+        """Percentage of the job's scanners that have finished.
+
+        Within a scanner, progress shows as its findings count, which
+        rises while it runs.
+        """
+        if not self.scanners:
+            return 100
+        finished = sum(
+            1 for s in self.scanners.values()
+            if s['status'] in ('done', 'failed')
+        )
+        return round(100 * finished / len(self.scanners))
+
+    def status(self):
+        with self._lock:
+            return {
+                'id': self.id,
+                'status': self.state,
+                'progress': self.progress(),
+                'created_at': self.created_at.isoformat(),
+                'started_at': (self.started_at.isoformat()
+                               if self.started_at else None),
+                'finished_at': (self.finished_at.isoformat()
+                                if self.finished_at else None),
+                'findings': len(self.results) + sum(
+                    s['findings'] for s in self.scanners.values()
+                    if s['status'] == 'running'
+                ),
+                'scanners': {
+                    name: dict(s) for name, s in self.scanners.items()
+                },
+                'error': self.error,
+            }
+
+    def _update(self, name, **fields):
+        with self._lock:
+            self.scanners[name].update(fields)
+
+
+class JobManager:
+    """Runs scan jobs on a bounded executor and keeps track of them."""
+
+    def __init__(self, max_workers=DEFAULT_MAX_JOBS,
+                 max_finished=DEFAULT_MAX_FINISHED):
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers), thread_name_prefix='scan-job'
+        )
+        self._jobs = OrderedDict()
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def submit(self, scanners, scope=None, on_complete=None):
+        """Queue a job running ``scanners`` and return it.
+
+        ``scanners`` maps a name to a callable returning findings; each
+        is called with the value of the ``scope`` context manager (None
+        without one), which is entered once for the whole job.
+        ``on_complete`` receives the job's findings unless every scanner
+        failed. An identical job still queued or running is returned
+        as is.
+        """
+        key = tuple(scanners)
+        with self._lock:
+            active = self._active.get(key)
+            if active is not None:
+                return active
+            job = Job(key, scanners)
+            self._jobs[job.id] = job
+            self._active[key] = job
+        self._executor.submit(self._run, job, scanners, scope, on_complete)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _run(self, job, scanners, scope, on_complete):
+        with job._lock:
+            job.state = RUNNING
+            job.started_at = _now()
+        try:
+            with (scope() if scope else nullcontext()) as value:
+                for name, scanner in scanners.items():
+                    self._run_scanner(job, name, scanner, value)
+        except Exception as e:
+            print(f"Error running scan job {job.id}: {e}")
+            job.error = str(e)
+            self._finish(job, FAILED)
+            return
+
+        if job.scanners and all(
+            s['status'] == 'failed' for s in job.scanners.values()
+        ):
+            self._finish(job, FAILED)
+            return
+        if on_complete is not None:
+            # The findings stand even if alerting them fails
+            try:
+                on_complete(job.results)
+            except Exception as e:
+                print(f"Error completing scan job {job.id}: {e}")
+                job.error = str(e)
+        self._finish(job, COMPLETED)
+
+    def _run_scanner(self, job, name, scanner, value):
+        job._update(name, status='running')
+        start = time.perf_counter()
+        findings = []
+        try:
+            for finding in scanner(value):
+                findings.append(finding)
+                job._update(name, findings=len(findings))
+        except Exception as e:
+            print(f"Error scanning {name} in job {job.id}: {e}")
+            job._update(
+                name, status='failed', error=str(e),
+                seconds=round(time.perf_counter() - start, 3)
+            )
+            return
+        with job._lock:
+            job.results.extend(findings)
+            job.scanners[name].update(
+                status='done', findings=len(findings),
+                seconds=round(time.perf_counter() - start, 3)
+            )
+
+    def _finish(self, job, state):
+        with job._lock:
+            job.state = state
+            job.finished_at = _now()
+        with self._lock:
+            if self._active.get(job.key) is job:
+                del self._active[job.key]
+            finished = [j for j in self._jobs.values() if j.done]
+            for old in finished[:max(0, len(finished) - self.max_finished)]:
+                del self._jobs[old.id]
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
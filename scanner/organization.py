@@ -0,0 +1,212 @@
+"""
+Organization scanning.
+
+Each member account is scanned by assuming an audit role in it. The STS
+credentials are cached per account until shortly before they expire,
+and scans ask the cache for them on every client lookup, so a long
+account scan switches to renewed credentials instead of failing.
+Accounts run on a bounded pool of threads (or, optionally, separate
+processes), each account runs its scanners on a few threads of its own,
+and every finding is tagged with the account it came from.
+"""
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from functools import partial
+
+from . import iam, regions, s3
+from .clients import ClientFactory
+from .context import ScanContext
+from .engine import RuleEngine
+from .pagination import paginate
+
+DEFAULT_ROLE_NAME = 'SecurityAudit'
+SESSION_NAME = 'aws-security-auditor'
+
+# Accounts scanned at once, and scanner threads within each account.
+DEFAULT_MAX_ACCOUNTS = 4
+DEFAULT_THREADS_PER_ACCOUNT = 3
+
+# Credentials are renewed this long before STS says they expire.
+REFRESH_MARGIN = timedelta(minutes=5)
+
+GLOBAL_SCANNERS = {
+    's3': s3.iter_scan,
+    'iam': iam.iter_scan,
+}
+SERVICES = ('s3', 'iam', 'ec2', 'sg')
+
+
+class CredentialCache:
+    """Assumed-role credentials per account, reused until near expiry."""
+
+    def __init__(self, role_name=DEFAULT_ROLE_NAME, external_id=None,
+                 clients=None):
+        self.role_name = role_name
+        self.external_id = external_id
+        self._clients = ClientFactory() if clients is None else clients
+        self._credentials = {}
+        self._lock = threading.Lock()
+
+    def role_arn(self, account_id):
+        return f"arn:aws:iam::{account_id}:role/{self.role_name}"
+
+    def credentials(self, account_id):
+        """boto3 client keyword arguments for the account's audit role."""
+        with self._lock:
+            cached = self._credentials.get(account_id)
+            now = datetime.now(timezone.utc)
+            if cached is not None and now < cached[1] - REFRESH_MARGIN:
+                return dict(cached[0])
+
+            params = {
+                'RoleArn': self.role_arn(account_id),
+                'RoleSessionName': SESSION_NAME,
+            }
+            if self.external_id:
+                params['ExternalId'] = self.external_id
+            sts = self._clients.client('sts')
+            assumed = sts.assume_role(**params)['Credentials']
+            credentials = {
+                'aws_access_key_id': assumed['AccessKeyId'],
+                'aws_secret_access_key': assumed['SecretAccessKey'],
+                'aws_session_token': assumed['SessionToken'],
+            }
+            self._credentials[account_id] = (
+                credentials, assumed['Expiration']
+            )
+            return dict(credentials)
+
+
+def accounts_in_ou(ou_id, clients=None):
+    """Active account IDs under an organizational unit, recursively."""
+    if clients is None:
+        clients = ClientFactory()
+    organizations = clients.client('organizations')
+    accounts = []
+    parents = [ou_id]
+    while parents:
+        parent = parents.pop(0)
+        accounts.extend(
+            account['Id'] for account in paginate(
+                organizations.list_accounts_for_parent, 'Accounts',
+                ParentId=parent
+            )
+            if account.get('Status', 'ACTIVE') == 'ACTIVE'
+        )
+        parents.extend(
+            unit['Id'] for unit in paginate(
+                organizations.list_organizational_units_for_parent,
+                'OrganizationalUnits', ParentId=parent
+            )
+        )
+    return accounts
+
+
+def iter_account(account_id, credentials, services=SERVICES,
+                 region_names=None, engine=None, options=None,
+                 max_workers=DEFAULT_THREADS_PER_ACCOUNT, clients=None):
+    """Yield account-tagged findings for one account.
+
+    ``credentials`` are boto3 client keyword arguments, or a callable
+    returning the current ones. Regional scanners cover the default
+    region unless ``region_names`` is 'all' or a list of regions.
+    """
+    context = ScanContext(
+        credentials=credentials, account=account_id, clients=clients
+    )
+    engine = engine or RuleEngine()
+    options = options or {}
+
+    tasks = []
+    for service in services:
+        if service in GLOBAL_SCANNERS:
+            tasks.append((f"{service} in {account_id}", partial(
+                GLOBAL_SCANNERS[service], context=context, engine=engine,
+                **options.get(service, {})
+            )))
+    regional = [s for s in services if s in regions.REGIONAL_SCANNERS]
+    if regional and region_names:
+        tasks.append((f"regions in {account_id}", partial(
+            regions.iter_scan, services=regional,
+            regions=None if region_names == 'all' else list(region_names),
+            context=context, engine=engine, options=options
+        )))
+    else:
+        for service in regional:
+            tasks.append((f"{service} in {account_id}", partial(
+                regions.REGIONAL_SCANNERS[service], context=context,
+                engine=engine, **options.get(service, {})
+            )))
+
+    for finding in regions.merge(tasks, max_workers):
+        yield finding.tag(account=account_id)
+
+
+def _scan_account_process(account_id, role_name, external_id, services,
+                          region_names, options):
+    # Runs in a worker process, which keeps its own credential cache
+    cache = CredentialCache(role_name, external_id)
+    return list(iter_account(
+        account_id, partial(cache.credentials, account_id), services,
+        region_names, options=options
+    ))
+
+
+def iter_scan(accounts=None, ou=None, role_name=DEFAULT_ROLE_NAME,
+              external_id=None, services=SERVICES, region_names=None,
+              max_accounts=DEFAULT_MAX_ACCOUNTS, processes=0, engine=None,
+              options=None, credential_cache=None, clients=None):
+    """Yield findings from every account, tagged with its account ID.
+
+    Accounts come from ``accounts`` and/or every active account under
+    ``ou``. With ``processes`` set, accounts are scanned in that many
+    worker processes instead of threads; each account's findings then
+    arrive together once it is done. Threads share the ``clients``
+    factory, while each worker process builds its own.
+    """
+    if clients is None:
+        clients = ClientFactory()
+    account_ids = list(accounts or [])
+    if ou:
+        account_ids += [
+            a for a in accounts_in_ou(ou, clients) if a not in account_ids
+        ]
+
+    if processes:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = {
+                executor.submit(
+                    _scan_account_process, account_id, role_name,
+                    external_id, services, region_names, options
+                ): account_id
+                for account_id in account_ids
+            }
+            for future in as_completed(futures):
+                try:
+                    yield from future.result()
+                except Exception as e:
+                    print(f"Error scanning account {futures[future]}: {e}")
+        return
+
+    cache = credential_cache or CredentialCache(
+        role_name, external_id, clients
+    )
+    engine = engine or RuleEngine()
+
+    def account_task(account_id):
+        def task():
+            return iter_account(
+                account_id, partial(cache.credentials, account_id),
+                services, region_names, engine, options, clients=clients
+            )
+        return task
+
+    yield from regions.merge(
+        [(f"account {a}", account_task(a)) for a in account_ids],
+        max_accounts
+    )
+
+
+def scan(accounts=None, ou=None, **kwargs):
+    return list(iter_scan(accounts, ou, **kwargs))
@@ -0,0 +1,21 @@
+def paginate_pages(method, token_key='NextToken', **kwargs):
+    """Yield every page of a paginated call.
+
+    EC2 style calls page with ``NextToken``; IAM style calls page with
+    ``Marker``. Pages are requested lazily, so callers evaluate each
+    page as it arrives and only ever hold one page in memory.
+    """
+    while True:
+        page = method(**kwargs)
+        yield page
+        token = page.get(token_key)
+        if not token:
+            return
+        kwargs[token_key] = token
+
+
+def paginate(method, result_key, token_key='NextToken', **kwargs):
+    """Yield every item under ``result_key`` across all pages."""
+    for page in paginate_pages(method, token_key, **kwargs):
+        for item in page.get(result_key, []):
+            yield item
@@ -0,0 +1,197 @@
+"""
+IAM policy analysis.
+
+Statements are normalized into Statement objects whose Action/Resource
+patterns are compiled once into regular expressions. A statement is
+overly permissive when it allows every action, or every action of a
+service, on every resource. Wildcards, lists, NotAction and NotResource
+are all taken into account.
+"""
+import hashlib
+import json
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+# Documents with at least this many statements are worth shipping to a
+# worker process when analyze_documents() is given a process pool.
+LARGE_DOCUMENT_STATEMENTS = 100
+
+# Upper bound on remembered verdicts before the cache starts over.
+MAX_CACHED_VERDICTS = 10000
+
+# Names no real action or resource can have. A pattern that matches them
+# matches anything in its scope.
+_ANY_NAME = '\x00'
+_ANY_ACTION = f'{_ANY_NAME}:{_ANY_NAME}'
+
+_verdicts = {}
+_verdicts_lock = threading.Lock()
+
+
+def document_digest(policy_doc):
+    """Stable hash of a policy document, independent of key order."""
+    canonical = json.dumps(policy_doc, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _as_tuple(value):
+    if value is None:
+        return ()
+    if isinstance(value, str):
+        return (value,)
+    return tuple(value)
+
+
+@lru_cache(maxsize=4096)
+def compile_patterns(patterns, ignore_case=False):
+    """Compile IAM wildcard patterns (* and ?) into a single matcher."""
+    if not patterns:
+        return None
+    body = '|'.join(
+        re.escape(pattern).replace(r'\*', '.*').replace(r'\?', '.')
+        for pattern in patterns
+    )
+    flags = re.DOTALL | (re.IGNORECASE if ignore_case else 0)
+    return re.compile(f'(?:{body})', flags)
+
+
+class Statement:
+    """A normalized policy statement with compiled matchers."""
+
+    __slots__ = ('effect', 'actions', 'not_actions',
+                 'resources', 'not_resources')
+
+    def __init__(self, stmt):
+        self.effect = stmt.get('Effect')
+        self.actions = _as_tuple(stmt.get('Action'))
+        self.not_actions = _as_tuple(stmt.get('NotAction'))
+        self.resources = _as_tuple(stmt.get('Resource'))
+        self.not_resources = _as_tuple(stmt.get('NotResource'))
+
+    def matches_action(self, action):
+        if self.actions:
+            return bool(compile_patterns(self.actions, True).fullmatch(action))
+        if self.not_actions:
+            matcher = compile_patterns(self.not_actions, True)
+            return not matcher.fullmatch(action)
+        return False
+
+    def matches_resource(self, resource):
+        if self.resources:
+            return bool(compile_patterns(self.resources).fullmatch(resource))
+        if self.not_resources:
+            matcher = compile_patterns(self.not_resources)
+            return not matcher.fullmatch(resource)
+        return False
+
+    def allows(self, action, resource='*'):
+        return (self.effect == 'Allow' and
+                self.matches_action(action) and
+                self.matches_resource(resource))
+
+    def covers_all_resources(self):
+        return self.matches_resource(_ANY_NAME)
+
+    def covers_all_actions(self):
+        return self.matches_action(_ANY_ACTION)
+
+    def covered_services(self):
+        """Services for which every action is allowed."""
+        services = {
+            pattern.split(':', 1)[0].lower()
+            for pattern in self.actions
+            if ':' in pattern
+        }
+        return sorted(
+            service for service in services
+            if self.matches_action(f'{service}:{_ANY_NAME}')
+        )
+
+    def is_overly_permissive(self):
+        if self.effect != 'Allow' or not self.covers_all_resources():
+            return False
+        return self.covers_all_actions() or bool(self.covered_services())
+
+
+def statements(policy_doc):
+    """Normalize a document's Statement entry into Statement objects."""
+    entries = policy_doc.get('Statement', [])
+    if isinstance(entries, dict):
+        entries = [entries]
+    return [Statement(stmt) for stmt in entries]
+
+
+def _analyze_uncached(policy_doc):
+    return tuple(
+        index for index, stmt in enumerate(statements(policy_doc))
+        if stmt.is_overly_permissive()
+    )
+
+
+def _remember(digest, verdict):
+    with _verdicts_lock:
+        if len(_verdicts) >= MAX_CACHED_VERDICTS:
+            _verdicts.clear()
+        _verdicts[digest] = verdict
+
+
+def _count(counts, hit):
+    if counts is not None:
+        with _verdicts_lock:
+            counts['verdict_hits' if hit else 'verdict_misses'] += 1
+
+
+def analyze(policy_doc, digest=None, counts=None):
+    """Return the indexes of overly permissive statements in a document.
+
+    Verdicts are cached by document digest, so identical documents
+    attached to many principals are only analyzed once. Cache hits and
+    misses are added to ``counts`` when given.
+    """
+    digest = digest or document_digest(policy_doc)
+    verdict = _verdicts.get(digest)
+    _count(counts, verdict is not None)
+    if verdict is None:
+        verdict = _analyze_uncached(policy_doc)
+        _remember(digest, verdict)
+    return verdict
+
+
+def analyze_documents(documents, processes=None, counts=None):
+    """Analyze many documents, returning a {digest: verdict} mapping.
+
+    Documents already seen are answered from the cache. When
+    ``processes`` is set, large documents are analyzed in a process pool
+    while small ones are handled inline. Cache hits and misses are
+    added to ``counts`` when given.
+    """
+    results = {}
+    pending = {}
+    for policy_doc in documents:
+        digest = document_digest(policy_doc)
+        if digest in results or digest in pending:
+            continue
+        verdict = _verdicts.get(digest)
+        if verdict is not None:
+            _count(counts, True)
+            results[digest] = verdict
+        elif (processes and
+                len(statements(policy_doc)) >= LARGE_DOCUMENT_STATEMENTS):
+            _count(counts, False)
+            pending[digest] = policy_doc
+        else:
+            results[digest] = analyze(policy_doc, digest, counts)
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            digests = list(pending)
+            verdicts = executor.map(
+                _analyze_uncached, [pending[d] for d in digests]
+            )
+            for digest, verdict in zip(digests, verdicts):
+                _remember(digest, verdict)
+                results[digest] = verdict
+
+    return results
@@ -0,0 +1,163 @@
+"""
+Client-side API rate limiting.
+
+Every request sent by a client from the ClientFactory takes a token from
+a bucket for its (service, operation, region). Each bucket adapts its
+rate: a throttling error halves it, and every successful response adds
+back a little, about ``INCREASE_PER_SECOND`` requests per second for
+each second of traffic. Scanners running in parallel therefore settle
+just under the account's real API quota instead of piling up retries.
+
+The limiter hooks botocore's request events, so retried attempts wait
+for a token and report their outcome like any other request.
+"""
+import threading
+import time
+from functools import partial
+
+# Requests per second a new bucket starts at, and its bounds.
+DEFAULT_RATE = 20.0
+MIN_RATE = 0.5
+MAX_RATE = 200.0
+
+# Rate is multiplied by this on throttling...
+DECREASE_FACTOR = 0.5
+# ...and grows back by about this much per second of successes.
+INCREASE_PER_SECOND = 1.0
+
+THROTTLING_CODES = frozenset([
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottled',
+    'RequestThrottledException',
+    'RequestLimitExceeded',
+    'TooManyRequestsException',
+    'SlowDown',
+])
+
+
+class TokenBucket:
+    """Token bucket whose refill rate adapts to throttling (AIMD)."""
+
+    def __init__(self, rate=DEFAULT_RATE, min_rate=MIN_RATE,
+                 max_rate=MAX_RATE):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate = min(max(rate, min_rate), max_rate)
+        self.tokens = 1.0
+        self.throttled_count = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        # Allow a burst of at most one second's worth of requests
+        capacity = max(1.0, self.rate)
+        elapsed = now - self._updated
+        self.tokens = min(capacity, self.tokens + elapsed * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Take a token, sleeping until one is available.
+
+        Returns the number of seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def succeeded(self):
+        with self._lock:
+            self.rate = min(
+                self.max_rate, self.rate + INCREASE_PER_SECOND / self.rate
+            )
+
+    def throttled(self):
+        with self._lock:
+            self.throttled_count += 1
+            self.rate = max(self.min_rate, self.rate * DECREASE_FACTOR)
+            self.tokens = min(self.tokens, 0.0)
+
+
+def is_throttling(code):
+    return code in THROTTLING_CODES
+
+
+class RateLimiter:
+    """Adaptive token buckets per (service, operation, region)."""
+
+    def __init__(self, rate=DEFAULT_RATE, min_rate=MIN_RATE,
+                 max_rate=MAX_RATE):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, service, operation, region=None):
+        key = (service, operation, region)
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(
+                    self.rate, self.min_rate, self.max_rate
+                )
+            return self._buckets[key]
+
+    def attach(self, client, region=None):
+        """Rate-limit every request the boto3 client sends."""
+        events = client.meta.events
+        events.register('before-send', partial(self._before_send, region))
+        events.register(
+            'response-received', partial(self._response_received, region)
+        )
+        return client
+
+    def _bucket_for_event(self, region, event_name):
+        # Event names look like "before-send.ec2.DescribeInstances"
+        _, service, operation = event_name.split('.', 2)
+        return self.bucket(service, operation, region)
+
+    def _before_send(self, region, event_name, **kwargs):
+        self._bucket_for_event(region, event_name).acquire()
+
+    def _response_received(self, region, event_name, parsed_response=None,
+                           exception=None, **kwargs):
+        # Connection errors say nothing about the API quota
+        if exception is not None or parsed_response is None:
+            return
+        bucket = self._bucket_for_event(region, event_name)
+        code = (parsed_response.get('Error') or {}).get('Code')
+        if is_throttling(code):
+            bucket.throttled()
+        elif code is None:
+            bucket.succeeded()
+
+    def rates(self):
+        """Current requests per second and throttle count per bucket."""
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {
+            key: {
+                'rate': round(bucket.rate, 2),
+                'throttled': bucket.throttled_count,
+            }
+            for key, bucket in buckets.items()
+        }
+
+    def summary(self):
+        lines = []
+        for (service, operation, region), r in sorted(
+            self.rates().items(), key=lambda item: str(item[0])
+        ):
+            lines.append(
+                f"{service} {operation} ({region or 'default'}): "
+                f"{r['rate']:.2f}/s, throttled {r['throttled']} times"
+            )
+        return "\n".join(lines)
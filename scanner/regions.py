@@ -0,0 +1,143 @@
+"""
+Multi-region fan-out.
+
+The enabled regions are discovered once with DescribeRegions and cached.
+Regional scanners (EC2 and security groups) then run for every region at
+once, at most ``max_workers`` at a time. Their findings are tagged with
+the region and merged into a single stream as they arrive.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import ec2, sg
+from .context import ScanContext
+from .engine import RuleEngine
+
+# Regional scans allowed to run at once across all regions.
+DEFAULT_MAX_WORKERS = 4
+
+# How long the discovered region list is trusted.
+REGION_CACHE_SECONDS = 60 * 60
+
+# Findings buffered between the regional scans and the consumer.
+MERGE_BUFFER = 1000
+
+REGIONAL_SCANNERS = {
+    'ec2': ec2.iter_scan,
+    'sg': sg.iter_scan,
+}
+
+_DONE = object()
+# account (None for the caller's own) -> (regions, expiry)
+_region_cache = {}
+_region_lock = threading.Lock()
+
+
+def enabled_regions(context=None, refresh=False):
+    """Regions enabled for the context's account, cached for a while."""
+    context = context or ScanContext(memoize=False)
+    with _region_lock:
+        now = time.monotonic()
+        cached = _region_cache.get(context.account)
+        if refresh or cached is None or now >= cached[1]:
+            response = context.client('ec2').describe_regions(Filters=[{
+                'Name': 'opt-in-status',
+                'Values': ['opt-in-not-required', 'opted-in']
+            }])
+            cached = (
+                sorted(
+                    region['RegionName'] for region in response['Regions']
+                ),
+                now + REGION_CACHE_SECONDS
+            )
+            _region_cache[context.account] = cached
+        return list(cached[0])
+
+
+def merge(tasks, max_workers=DEFAULT_MAX_WORKERS):
+    """Run (label, task) pairs concurrently and yield their items.
+
+    Each task is a callable returning an iterable. Items are yielded as
+    soon as any task produces them; a failing task is reported and the
+    others carry on. Closing the generator stops the remaining tasks.
+    """
+    results = queue.Queue(maxsize=MERGE_BUFFER)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(label, task):
+        try:
+            for item in task():
+                if not put(item):
+                    return
+        except Exception as e:
+            print(f"Error scanning {label}: {e}")
+        finally:
+            put(_DONE)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        for label, task in tasks:
+            executor.submit(run, label, task)
+        remaining = len(tasks)
+        while remaining:
+            item = results.get()
+            if item is _DONE:
+                remaining -= 1
+            else:
+                yield item
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _regional_task(scanner, region, context, engine, options):
+    def task():
+        for finding in scanner(context=context, engine=engine, **options):
+            yield finding.tag(region=region)
+    return task
+
+
+def iter_scan(services=('ec2', 'sg'), regions=None,
+              max_workers=DEFAULT_MAX_WORKERS, context=None, engine=None,
+              options=None):
+    """Yield region-tagged findings from regional scanners.
+
+    ``regions`` defaults to every enabled region. ``options`` maps a
+    service name to extra keyword arguments for its scanner. Scanners in
+    the same region share one view of ``context``, so EC2 and security
+    groups still share describe results.
+    """
+    context = context or ScanContext()
+    engine = engine or RuleEngine()
+    options = options or {}
+    if regions is None:
+        regions = enabled_regions(context)
+
+    tasks = []
+    for region in regions:
+        regional = context.for_region(region)
+        for service in services:
+            tasks.append((f"{service} in {region}", _regional_task(
+                REGIONAL_SCANNERS[service], region, regional, engine,
+                options.get(service, {})
+            )))
+    return merge(tasks, max_workers)
+
+
+def scan(services=('ec2', 'sg'), regions=None,
+         max_workers=DEFAULT_MAX_WORKERS, context=None, engine=None,
+         options=None):
+    return list(iter_scan(
+        services, regions, max_workers, context, engine, options
+    ))
@@ -9,7 +9,8 @@ cis_rules = {
             "Restrict SSH access to trusted IP addresses only. "
             "Remove 0.0.0.0/0 from port 22."
         ),
-        "risk_level": "HIGH"
+        "risk_level": "HIGH",
+        "resource_type": "security_group"
     },
     "sg_http_open": {
         "cis_rule": (
@@ -20,7 +21,8 @@ cis_rules = {
             "Restrict HTTP access to trusted IP addresses only. "
             "Remove 0.0.0.0/0 from port 80."
         ),
-        "risk_level": "MEDIUM"
+        "risk_level": "MEDIUM",
+        "resource_type": "security_group"
     },
     "sg_https_open": {
         "cis_rule": (
@@ -31,7 +33,8 @@ cis_rules = {
             "Restrict HTTPS access to trusted IP addresses only. "
             "Remove 0.0.0.0/0 from port 443."
         ),
-        "risk_level": "MEDIUM"
+        "risk_level": "MEDIUM",
+        "resource_type": "security_group"
     },
     "sg_other_open": {
         "cis_rule": (
@@ -42,7 +45,8 @@ cis_rules = {
             "Review and restrict access to this port to "
             "trusted IP addresses only."
         ),
-        "risk_level": "LOW"
+        "risk_level": "LOW",
+        "resource_type": "security_group"
     },
     "sg_rdp_open": {
         "cis_rule": (
@@ -53,7 +57,8 @@ cis_rules = {
             "Restrict RDP access to trusted IP addresses only. "
             "Remove 0.0.0.0/0 from port 3389."
         ),
-        "risk_level": "HIGH"
+        "risk_level": "HIGH",
+        "resource_type": "security_group"
     },
 
     # IAM Rules
@@ -63,7 +68,8 @@ cis_rules = {
             "Ensure IAM policies are scoped to only necessary permissions. "
             "Avoid using 'Action': '*' and 'Resource': '*' in policies."
         ),
-        "risk_level": "HIGH"
+        "risk_level": "HIGH",
+        "resource_type": "iam_principal"
     },
     "iam_user_without_mfa": {
         "cis_rule": (
@@ -73,7 +79,8 @@ cis_rules = {
         "remediation": (
             "Enable MFA for all IAM users that have a console password."
         ),
-        "risk_level": "HIGH"
+        "risk_level": "HIGH",
+        "resource_type": "iam_credentials"
     },
     "iam_root_access_key": {
         "cis_rule": (
@@ -81,7 +88,8 @@ cis_rules = {
             "every 90 days or less"
         ),
         "remediation": "Rotate access keys every 90 days or less.",
-        "risk_level": "HIGH"
+        "risk_level": "HIGH",
+        "resource_type": "iam_credentials"
     },
     "iam_password_policy": {
         "cis_rule": (
@@ -92,7 +100,8 @@ cis_rules = {
             "Update IAM password policy to require uppercase letters, "
             "numbers, and special characters."
         ),
-        "risk_level": "MEDIUM"
+        "risk_level": "MEDIUM",
+        "resource_type": "iam_password_policy"
     },
 
     # S3 Rules
@@ -105,7 +114,8 @@ cis_rules = {
             "Review bucket ACLs and restrict access to trusted accounts only. "
             "Do not grant public read/write permissions."
         ),
-        "risk_level": "HIGH"
+        "risk_level": "HIGH",
+        "resource_type": "s3_bucket"
     },
     "s3_versioning_disabled": {
         "cis_rule": (
@@ -115,7 +125,8 @@ cis_rules = {
             "Enable versioning on S3 buckets to protect against "
             "accidental deletion and maintain object history."
         ),
-        "risk_level": "MEDIUM"
+        "risk_level": "MEDIUM",
+        "resource_type": "s3_bucket"
     },
     "s3_logging_disabled": {
         "cis_rule": (
@@ -124,7 +135,8 @@ cis_rules = {
         "remediation": (
             "Enable access logging on S3 buckets to track access requests."
         ),
-        "risk_level": "MEDIUM"
+        "risk_level": "MEDIUM",
+        "resource_type": "s3_bucket"
     },
     "s3_encryption_disabled": {
         "cis_rule": (
@@ -134,7 +146,8 @@ cis_rules = {
             "Enable server-side encryption for S3 buckets to "
             "protect data at rest."
         ),
-        "risk_level": "HIGH"
+        "risk_level": "HIGH",
+        "resource_type": "s3_bucket"
     },
 
     # EC2 Rules
@@ -146,7 +159,8 @@ cis_rules = {
             "Review EC2 instances and remove public IPs if not required. "
             "Use private subnets and NAT gateways instead."
         ),
-        "risk_level": "MEDIUM"
+        "risk_level": "MEDIUM",
+        "resource_type": "ec2_instance"
     },
     "ec2_unencrypted_volumes": {
         "cis_rule": (
@@ -155,7 +169,8 @@ cis_rules = {
         "remediation": (
             "Enable encryption for all EC2 volumes to protect data at rest."
         ),
-        "risk_level": "HIGH"
+        "risk_level": "HIGH",
+        "resource_type": "ec2_volume"
     },
     "ec2_public_snapshot": {
         "cis_rule": (
@@ -166,7 +181,8 @@ cis_rules = {
             "Review and restrict access to EC2 snapshots to "
             "trusted accounts only."
         ),
-        "risk_level": "HIGH"
+        "risk_level": "HIGH",
+        "resource_type": "ec2_snapshot"
     },
     "ec2_termination_protection": {
         "cis_rule": (
@@ -177,6 +193,31 @@ cis_rules = {
             "Enable termination protection for critical EC2 instances "
             "to prevent accidental termination."
         ),
-        "risk_level": "MEDIUM"
+        "risk_level": "MEDIUM",
+        "resource_type": "ec2_instance"
     }
 }
+
+# Ports, as inclusive (from, to) ranges, that get their own security
+# group rule. Open ports outside these ranges fall under sg_other_open.
+sensitive_ports = [
+    (22, 22, "sg_ssh_open"),
+    (80, 80, "sg_http_open"),
+    (443, 443, "sg_https_open"),
+    (3389, 3389, "sg_rdp_open"),
+]
+
+# Source ranges that never count as exposure (internal address space).
+trusted_cidrs = [
+    "10.0.0.0/8",
+    "172.16.0.0/12",
+    "192.168.0.0/16",
+    "100.64.0.0/10",
+    "fc00::/7",
+]
+
+# Source ranges that always count as exposure, however narrow.
+public_cidrs = []
+
+# Any other source range at least this broad is treated as public.
+public_prefix_lengths = {4: 8, 6: 32}
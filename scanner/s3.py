@@ -1,118 +1,251 @@
-import boto3
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 from botocore.exceptions import ClientError
-from .rules import cis_rules
+from .clients import ClientFactory
+from .engine import RuleEngine, rule
+from .pagination import paginate
+
+# Number of bucket checks allowed in flight at once.
+DEFAULT_MAX_WORKERS = 10
+
+# GetBucketLocation reports these legacy values for the classic regions.
+LEGACY_LOCATIONS = {
+    None: 'us-east-1',
+    '': 'us-east-1',
+    'EU': 'eu-west-1',
+}
 
 
-def scan():
-    findings = []
-    s3 = boto3.client('s3')
-    buckets = s3.list_buckets()['Buckets']
+class RegionalClients:
+    """S3 clients per region, with a cache of bucket regions."""
 
-    for bucket in buckets:
+    def __init__(self, factory, credentials=None, account=None):
+        self._factory = factory
+        self._credentials = credentials
+        self._account = account
+        self._bucket_regions = {}
+
+    def client(self, region=None):
+        """Return the shared client for a region."""
+        credentials = self._credentials
+        if callable(credentials):
+            credentials = credentials()
+        return self._factory.client('s3', region, credentials, self._account)
+
+    def bucket_region(self, bucket):
+        """Resolve and cache the region a bucket lives in."""
         bucket_name = bucket['Name']
+        if bucket_name in self._bucket_regions:
+            return self._bucket_regions[bucket_name]
+
+        # ListBuckets already reports the region on current API versions.
+        region = bucket.get('BucketRegion')
+        if not region:
+            try:
+                location = self.client().get_bucket_location(
+                    Bucket=bucket_name
+                )
+                constraint = location.get('LocationConstraint')
+                region = LEGACY_LOCATIONS.get(constraint, constraint)
+            except Exception as e:
+                print(f"Error resolving region for {bucket_name}: {e}")
+                region = None
+
+        self._bucket_regions[bucket_name] = region
+        return region
+
+
+ALL_USERS_URI = 'http://acs.amazonaws.com/groups/global/AllUsers'
+
+
+def _get_acl(s3, bucket_name):
+    try:
+        return s3.get_bucket_acl(Bucket=bucket_name)
+    except Exception as e:
+        print(f"Error checking ACL for {bucket_name}: {e}")
+        return None
+
+
+def _get_versioning(s3, bucket_name):
+    try:
+        return s3.get_bucket_versioning(Bucket=bucket_name)
+    except Exception as e:
+        print(f"Error checking versioning for {bucket_name}: {e}")
+        return None
+
+
+def _get_logging(s3, bucket_name):
+    try:
+        return s3.get_bucket_logging(Bucket=bucket_name)
+    except Exception as e:
+        print(f"Error checking logging for {bucket_name}: {e}")
+        return None
+
+
+def _get_encryption(s3, bucket_name):
+    try:
+        return s3.get_bucket_encryption(Bucket=bucket_name)
+    except ClientError as e:
+        if (e.response['Error']['Code'] ==
+                'ServerSideEncryptionConfigurationNotFoundError'):
+            return {}
+        print(f"Error checking encryption for {bucket_name}: {e}")
+        return None
+
+
+# Per-bucket configuration calls, keyed by the record field they fill.
+# A field is None when its call failed, so rules skip what is unknown.
+BUCKET_CALLS = (
+    ('Acl', _get_acl),
+    ('Versioning', _get_versioning),
+    ('Logging', _get_logging),
+    ('Encryption', _get_encryption),
+)
+
+
+def _fetch(clients, region, bucket, fetch):
+    # The region future was submitted first, so it is already running
+    return fetch(clients.client(region.result()), bucket['Name'])
+
+
+def _submit_bucket(executor, clients, bucket):
+    """Resolve a bucket's region, then run its calls concurrently."""
+    region = executor.submit(clients.bucket_region, bucket)
+    calls = [
+        (key, executor.submit(_fetch, clients, region, bucket, fetch))
+        for key, fetch in BUCKET_CALLS
+    ]
+    return region, calls
 
-        # Check public access
-        try:
-            acl = s3.get_bucket_acl(Bucket=bucket_name)
-            for grant in acl.get('Grants', []):
-                grantee = grant.get('Grantee', {})
-                if (grantee.get('URI') ==
-                        'http://acs.amazonaws.com/groups/global/AllUsers'):
-                    findings.append({
-                        "resource": bucket_name,
-                        "type": "S3 Bucket",
-                        "risk": (
-                            cis_rules["s3_public_access"]["risk_level"]
-                        ),
-                        "issue": "Bucket is publicly accessible",
-                        "cis_rule": (
-                            cis_rules["s3_public_access"]["cis_rule"]
-                        ),
-                        "remediation": (
-                            cis_rules["s3_public_access"]["remediation"]
-                        )
-                    })
-        except Exception as e:
-            print(f"Error checking ACL for {bucket_name}: {e}")
-
-        # Check versioning
-        try:
-            versioning = s3.get_bucket_versioning(Bucket=bucket_name)
-            if versioning.get('Status') != 'Enabled':
-                findings.append({
-                    "resource": bucket_name,
-                    "type": "S3 Bucket",
-                    "risk": (
-                        cis_rules["s3_versioning_disabled"]["risk_level"]
-                    ),
-                    "issue": "Bucket versioning is not enabled",
-                    "cis_rule": (
-                        cis_rules["s3_versioning_disabled"]["cis_rule"]
-                    ),
-                    "remediation": (
-                        cis_rules["s3_versioning_disabled"]["remediation"]
-                    )
-                })
-        except Exception as e:
-            print(f"Error checking versioning for {bucket_name}: {e}")
-
-        # Check logging
-        try:
-            logging = s3.get_bucket_logging(Bucket=bucket_name)
-            if not logging.get('LoggingEnabled'):
-                findings.append({
-                    "resource": bucket_name,
-                    "type": "S3 Bucket",
-                    "risk": (
-                        cis_rules["s3_logging_disabled"]["risk_level"]
-                    ),
-                    "issue": "Bucket access logging is not enabled",
-                    "cis_rule": (
-                        cis_rules["s3_logging_disabled"]["cis_rule"]
-                    ),
-                    "remediation": (
-                        cis_rules["s3_logging_disabled"]["remediation"]
-                    )
-                })
-        except Exception as e:
-            print(f"Error checking logging for {bucket_name}: {e}")
-
-        # Check encryption
-        try:
-            encryption = s3.get_bucket_encryption(Bucket=bucket_name)
-            if not encryption.get('ServerSideEncryptionConfiguration'):
-                findings.append({
-                    "resource": bucket_name,
-                    "type": "S3 Bucket",
-                    "risk": (
-                        cis_rules["s3_encryption_disabled"]["risk_level"]
-                    ),
-                    "issue": "Bucket encryption is not enabled",
-                    "cis_rule": (
-                        cis_rules["s3_encryption_disabled"]["cis_rule"]
-                    ),
-                    "remediation": (
-                        cis_rules["s3_encryption_disabled"]["remediation"]
-                    )
-                })
-        except ClientError as e:
-            if (e.response['Error']['Code'] ==
-                    'ServerSideEncryptionConfigurationNotFoundError'):
-                findings.append({
-                    "resource": bucket_name,
-                    "type": "S3 Bucket",
-                    "risk": (
-                        cis_rules["s3_encryption_disabled"]["risk_level"]
-                    ),
-                    "issue": "Bucket encryption is not enabled",
-                    "cis_rule": (
-                        cis_rules["s3_encryption_disabled"]["cis_rule"]
-                    ),
-                    "remediation": (
-                        cis_rules["s3_encryption_disabled"]["remediation"]
-                    )
-                })
+
+def _bucket_record(bucket, region, calls):
+    record = {
+        'Name': bucket['Name'],
+        'CreationDate': bucket.get('CreationDate'),
+        'Region': region.result(),
+    }
+    for key, future in calls:
+        record[key] = future.result()
+    return record
+
+
+def _bucket_metadata(bucket):
+    return {
+        'CreationDate': bucket.get('CreationDate'),
+        'BucketRegion': bucket.get('BucketRegion'),
+    }
+
+
+def collect(max_workers=DEFAULT_MAX_WORKERS, state=None, bucket_names=None,
+            context=None):
+    """Yield ('s3_bucket', record) for every bucket in the account.
+
+    With a StateStore, buckets whose listing is unchanged reuse the
+    record from the previous scan instead of being checked again.
+    ``bucket_names`` limits the scan to those buckets, and ``context``
+    supplies credentials for another account.
+    """
+    max_workers = max(1, max_workers)
+    if context is not None:
+        clients = RegionalClients(
+            context.clients, context.current_credentials, context.account
+        )
+    else:
+        # Size the pool so every worker gets its own connection
+        clients = RegionalClients(
+            ClientFactory(max_pool_connections=max_workers)
+        )
+    if bucket_names is not None:
+        buckets = [{'Name': bucket_name} for bucket_name in bucket_names]
+    else:
+        # Paging with MaxBuckets also has ListBuckets report each region.
+        buckets = paginate(
+            clients.client().list_buckets, 'Buckets', 'ContinuationToken',
+            MaxBuckets=1000
+        )
+
+    # Each bucket's configuration calls run as separate tasks against its
+    # regional endpoint. Only max_workers buckets are in flight at once,
+    # and records are yielded in bucket order to keep the output
+    # identical to a serial scan, so memory does not grow with the
+    # number of buckets.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = deque()
+
+        def finish():
+            bucket, digest, record, pending = in_flight.popleft()
+            if record is not None:
+                return 's3_bucket', record
+            record = _bucket_record(bucket, *pending)
+            # Records with a failed call are checked again next time
+            if digest is not None and all(
+                record[key] is not None for key, _ in BUCKET_CALLS
+            ):
+                state.save('s3', bucket['Name'], digest, record)
+            return 's3_bucket', record
+
+        for bucket in buckets:
+            digest, record = None, None
+            if state is not None:
+                digest, record = state.lookup(
+                    's3', bucket['Name'], _bucket_metadata(bucket)
+                )
+            if record is not None:
+                in_flight.append((bucket, None, record, None))
             else:
-                print(f"Error checking encryption for {bucket_name}: {e}")
+                in_flight.append((
+                    bucket, digest, None,
+                    _submit_bucket(executor, clients, bucket)
+                ))
+            if len(in_flight) >= max_workers:
+                yield finish()
+        while in_flight:
+            yield finish()
+    if state is not None:
+        state.commit()
+
+
+def _match(bucket, issue):
+    return {"resource": bucket['Name'], "type": "S3 Bucket", "issue": issue}
+
+
+@rule("s3_public_access")
+def _public_access(bucket):
+    for grant in (bucket.get('Acl') or {}).get('Grants', []):
+        if grant.get('Grantee', {}).get('URI') == ALL_USERS_URI:
+            yield _match(bucket, "Bucket is publicly accessible")
+
+
+@rule("s3_versioning_disabled")
+def _versioning_disabled(bucket):
+    versioning = bucket.get('Versioning')
+    if versioning is not None and versioning.get('Status') != 'Enabled':
+        yield _match(bucket, "Bucket versioning is not enabled")
+
+
+@rule("s3_logging_disabled")
+def _logging_disabled(bucket):
+    logging = bucket.get('Logging')
+    if logging is not None and not logging.get('LoggingEnabled'):
+        yield _match(bucket, "Bucket access logging is not enabled")
+
+
+@rule("s3_encryption_disabled")
+def _encryption_disabled(bucket):
+    encryption = bucket.get('Encryption')
+    if (encryption is not None and
+            not encryption.get('ServerSideEncryptionConfiguration')):
+        yield _match(bucket, "Bucket encryption is not enabled")
+
+
+def iter_scan(max_workers=DEFAULT_MAX_WORKERS, engine=None, state=None,
+              context=None):
+    """Yield findings as each bucket is checked."""
+    engine = engine or RuleEngine()
+    return engine.stream(collect(max_workers, state, context=context))
+
 
-    return findings
+def scan(max_workers=DEFAULT_MAX_WORKERS, engine=None, state=None,
+         context=None):
+    return list(iter_scan(max_workers, engine, state, context))
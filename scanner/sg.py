@@ -1,88 +1,308 @@
-import boto3
-from .rules import cis_rules
-
-
-def scan():
-    findings = []
-    ec2 = boto3.client('ec2')
-    security_groups = ec2.describe_security_groups()['SecurityGroups']
-
-    for sg in security_groups:
-        for permission in sg['IpPermissions']:
-            for ip_range in permission.get('IpRanges', []):
-                if ip_range.get('CidrIp') == '0.0.0.0/0':
-                    port = permission.get('FromPort', 'ALL')
-                    finding = {
-                        "resource": sg['GroupId'],
-                        "type": "Security Group",
-                        "risk": "HIGH",
-                        "issue": f"Open to the world on port {port}"
-                    }
-
-                    # Masukkan info CIS untuk port 22 (SSH)
-                    if port == 22:
-                        finding.update({
-                            "risk": (
-                                cis_rules["sg_ssh_open"]["risk_level"]
-                            ),
-                            "cis_rule": (
-                                cis_rules["sg_ssh_open"]["cis_rule"]
-                            ),
-                            "remediation": (
-                                cis_rules["sg_ssh_open"]["remediation"]
-                            )
-                        })
-                    # Masukkan info CIS untuk port 80 (HTTP)
-                    elif port == 80:
-                        finding.update({
-                            "risk": (
-                                cis_rules["sg_http_open"]["risk_level"]
-                            ),
-                            "cis_rule": (
-                                cis_rules["sg_http_open"]["cis_rule"]
-                            ),
-                            "remediation": (
-                                cis_rules["sg_http_open"]["remediation"]
-                            )
-                        })
-                    # Masukkan info CIS untuk port 443 (HTTPS)
-                    elif port == 443:
-                        finding.update({
-                            "risk": (
-                                cis_rules["sg_https_open"]["risk_level"]
-                            ),
-                            "cis_rule": (
-                                cis_rules["sg_https_open"]["cis_rule"]
-                            ),
-                            "remediation": (
-                                cis_rules["sg_https_open"]["remediation"]
-                            )
-                        })
-                    # Masukkan info CIS untuk port 3389 (RDP)
-                    elif port == 3389:
-                        finding.update({
-                            "risk": (
-                                cis_rules["sg_rdp_open"]["risk_level"]
-                            ),
-                            "cis_rule": (
-                                cis_rules["sg_rdp_open"]["cis_rule"]
-                            ),
-                            "remediation": (
-                                cis_rules["sg_rdp_open"]["remediation"]
-                            )
-                        })
-                    # Masukkan info CIS untuk port lainnya
-                    else:
-                        finding.update({
-                            "risk": (
-                                cis_rules["sg_other_open"]["risk_level"]
-                            ),
-                            "cis_rule": (
-                                cis_rules["sg_other_open"]["cis_rule"]
-                            ),
-                            "remediation": (
-                                cis_rules["sg_other_open"]["remediation"]
-                            )
-                        })
-                    findings.append(finding)
-    return findings
+import ipaddress
+from bisect import bisect_left
+from collections import defaultdict
+from functools import lru_cache
+
+from .cidr import CidrTrie
+from .context import ScanContext, network_interfaces
+from .engine import RuleEngine, rule
+from .rules import (
+    cis_rules, public_cidrs, public_prefix_lengths, sensitive_ports,
+    trusted_cidrs
+)
+
+ALL_PORTS = (0, 65535)
+ICMP_PROTOCOLS = ('icmp', 'icmpv6', '1', '58')
+
+
+class PortIndex:
+    """Sorted interval index over the sensitive port ranges.
+
+    Ranges must not overlap, so the ranges covered by a permission are a
+    contiguous run found with one binary search.
+    """
+
+    def __init__(self, entries):
+        self._entries = sorted(entries)
+        for previous, current in zip(self._entries, self._entries[1:]):
+            if current[0] <= previous[1]:
+                raise ValueError(
+                    f"Overlapping sensitive port ranges: {previous} and "
+                    f"{current}"
+                )
+        self._ends = [entry[1] for entry in self._entries]
+
+    def covering(self, from_port, to_port):
+        """Return the (from, to, rule_id) entries overlapping a range."""
+        matches = []
+        i = bisect_left(self._ends, from_port)
+        while i < len(self._entries) and self._entries[i][0] <= to_port:
+            matches.append(self._entries[i])
+            i += 1
+        return matches
+
+
+port_index = PortIndex(sensitive_ports)
+
+WORLD_CIDRS = ('0.0.0.0/0', '::/0')
+
+RISK_LEVELS = ('LOW', 'MEDIUM', 'HIGH')
+
+
+class ExposureIndex:
+    """Decides whether a source CIDR exposes a port to the internet.
+
+    Trusted and public ranges are compiled into one CidrTrie; the most
+    specific range containing a source wins. Sources in neither set are
+    exposed when they are at least as broad as public_prefix_lengths.
+    """
+
+    def __init__(self, trusted=(), public=(), prefix_lengths=None):
+        self._trie = CidrTrie(
+            [(cidr, 'trusted') for cidr in trusted] +
+            [(cidr, 'public') for cidr in public]
+        )
+        self._prefix_lengths = prefix_lengths or public_prefix_lengths
+        self._verdicts = {}
+
+    def is_exposed(self, cidr):
+        if cidr not in self._verdicts:
+            self._verdicts[cidr] = self._classify(cidr)
+        return self._verdicts[cidr]
+
+    def _classify(self, cidr):
+        try:
+            network = ipaddress.ip_network(cidr, strict=False)
+        except ValueError:
+            print(f"Ignoring invalid CIDR {cidr}")
+            return False
+        label = self._trie.lookup(network)
+        if label is not None:
+            return label == 'public'
+        return network.prefixlen <= self._prefix_lengths[network.version]
+
+
+class PrefixLists:
+    """Resolves managed prefix list IDs to CIDRs, once per list."""
+
+    def __init__(self, context):
+        self._context = context
+        self._entries = {}
+
+    def cidrs(self, prefix_list_id):
+        if prefix_list_id not in self._entries:
+            try:
+                self._entries[prefix_list_id] = [
+                    entry['Cidr'] for entry in self._context.items(
+                        'ec2', 'get_managed_prefix_list_entries', 'Entries',
+                        PrefixListId=prefix_list_id
+                    )
+                ]
+            except Exception as e:
+                print(f"Error resolving prefix list {prefix_list_id}: {e}")
+                self._entries[prefix_list_id] = []
+        return self._entries[prefix_list_id]
+
+
+@lru_cache(maxsize=32)
+def exposure_index(trusted=()):
+    """ExposureIndex for the default trusted ranges plus ``trusted``."""
+    return ExposureIndex(
+        trusted=trusted_cidrs + list(trusted),
+        public=public_cidrs
+    )
+
+
+def _source_cidrs(permission, prefix_lists):
+    for ip_range in permission.get('IpRanges', []):
+        yield ip_range.get('CidrIp')
+    for ip_range in permission.get('Ipv6Ranges', []):
+        yield ip_range.get('CidrIpv6')
+    for prefix_list in permission.get('PrefixListIds', []):
+        yield from prefix_lists.get(prefix_list['PrefixListId'], [])
+
+
+def _port_range(permission):
+    """Return (from, to, all_traffic) for a permission, or None for ICMP."""
+    protocol = str(permission.get('IpProtocol', 'tcp'))
+    if protocol in ICMP_PROTOCOLS:
+        return None
+    from_port = permission.get('FromPort')
+    if protocol == '-1' or from_port in (None, -1):
+        return ALL_PORTS + (True,)
+    return from_port, permission.get('ToPort', from_port), False
+
+
+def _port_label(from_port, to_port):
+    if from_port == to_port:
+        return f"port {from_port}"
+    return f"ports {from_port}-{to_port}"
+
+
+def classify(permission):
+    """Resolve a permission to (rule_id, port label) pairs.
+
+    Every sensitive range the permission reaches gets its own rule. Any
+    remaining ports fall under sg_other_open.
+    """
+    port_range = _port_range(permission)
+    if port_range is None:
+        return [("sg_other_open", f"port {permission.get('FromPort', 'ALL')}")]
+
+    from_port, to_port, all_traffic = port_range
+    matches = []
+    covered = 0
+    for start, end, rule_id in port_index.covering(from_port, to_port):
+        start, end = max(start, from_port), min(end, to_port)
+        covered += end - start + 1
+        matches.append((rule_id, _port_label(start, end)))
+
+    if covered < to_port - from_port + 1:
+        if all_traffic:
+            label = "port ALL"
+        else:
+            label = _port_label(from_port, to_port)
+        matches.append(("sg_other_open", label))
+    return matches
+
+
+def attachment_index(context, group_ids=None):
+    """Map each security group ID to the ENIs and instances using it.
+
+    Built from one paginated describe_network_interfaces walk, so the
+    join costs O(ENIs + group references) regardless of group count.
+    The full walk is the one EC2 reads public IPs from, so a shared
+    context fetches it once. ``group_ids`` limits the walk to ENIs in
+    those groups. Detached ENIs reach nothing and are left out.
+    """
+    if group_ids is not None:
+        enis = context.items(
+            'ec2', 'describe_network_interfaces', 'NetworkInterfaces',
+            Filters=[{'Name': 'group-id', 'Values': list(group_ids)}],
+            MaxResults=1000
+        )
+    else:
+        enis = network_interfaces(context)
+    index = defaultdict(list)
+    for eni in enis:
+        if eni.get('Status') != 'in-use' and not eni.get('Attachment'):
+            continue
+        attachment = (
+            eni['NetworkInterfaceId'],
+            eni.get('Attachment', {}).get('InstanceId')
+        )
+        for group in eni.get('Groups', []):
+            index[group['GroupId']].append(attachment)
+    return index
+
+
+def scored_risk(risk, attached):
+    """Escalate exposure on attached groups, downgrade unattached ones."""
+    level = RISK_LEVELS.index(risk) + (1 if attached else -1)
+    return RISK_LEVELS[min(max(level, 0), len(RISK_LEVELS) - 1)]
+
+
+def _audience(cidr):
+    if cidr in WORLD_CIDRS:
+        return "the world"
+    return cidr
+
+
+def collect(trusted=None, reachability=True, context=None, group_ids=None):
+    """Yield ('security_group', record) for every security group.
+
+    Records keep the raw permissions together with what is needed to
+    judge them: resolved prefix list entries, the extra trusted ranges,
+    the exposures found per rule and, when reachability is on, the
+    number of attached ENIs. ``group_ids`` limits the scan to those
+    groups.
+    """
+    context = context or ScanContext(memoize=False)
+    attachments = None
+    if reachability:
+        try:
+            attachments = attachment_index(context, group_ids)
+        except Exception as e:
+            print(f"Error listing network interfaces: {e}")
+    prefix_lists = PrefixLists(context)
+
+    # MaxResults cannot be combined with GroupIds
+    if group_ids is not None:
+        params = {'GroupIds': list(group_ids)}
+    else:
+        params = {'MaxResults': 1000}
+    for sg in context.items(
+        'ec2', 'describe_security_groups', 'SecurityGroups', **params
+    ):
+        record = {
+            'GroupId': sg['GroupId'],
+            'IpPermissions': sg['IpPermissions'],
+            'PrefixLists': {
+                prefix_list['PrefixListId']: prefix_lists.cidrs(
+                    prefix_list['PrefixListId']
+                )
+                for permission in sg['IpPermissions']
+                for prefix_list in permission.get('PrefixListIds', [])
+            },
+            'Trusted': list(trusted or []),
+            'Attachments': None,
+        }
+        if attachments is not None:
+            record['Attachments'] = len(attachments.get(sg['GroupId'], []))
+        record['Exposures'] = exposures_by_rule(record)
+        yield 'security_group', record
+
+
+def _exposures(group):
+    """Yield (cidr, rule_id, port label) for every exposed permission."""
+    exposure = exposure_index(tuple(group.get('Trusted', [])))
+    prefix_lists = group.get('PrefixLists', {})
+    for permission in group['IpPermissions']:
+        for cidr in _source_cidrs(permission, prefix_lists):
+            if cidr and exposure.is_exposed(cidr):
+                for rule_id, label in classify(permission):
+                    yield cidr, rule_id, label
+
+
+def exposures_by_rule(group):
+    """{rule_id: [(cidr, label)]} for every exposed permission."""
+    by_rule = defaultdict(list)
+    for cidr, rule_id, label in _exposures(group):
+        by_rule[rule_id].append((cidr, label))
+    return dict(by_rule)
+
+
+def _open_port_rule(rule_id):
+    def predicate(group):
+        attachments = group.get('Attachments')
+        # collect() classifies each record once for all open-port rules
+        exposures = group.get('Exposures')
+        if exposures is None:
+            exposures = exposures_by_rule(group)
+        for cidr, label in exposures.get(rule_id, []):
+            match = {
+                "resource": group['GroupId'],
+                "type": "Security Group",
+                "issue": f"Open to {_audience(cidr)} on {label}"
+            }
+            if attachments is not None:
+                match["risk"] = scored_risk(
+                    cis_rules[rule_id]["risk_level"], attachments > 0
+                )
+                match["attachments"] = attachments
+            yield match
+    return predicate
+
+
+for _rule_id in [entry[2] for entry in sensitive_ports] + ["sg_other_open"]:
+    rule(_rule_id)(_open_port_rule(_rule_id))
+
+
+def iter_scan(trusted=None, reachability=True, context=None, engine=None):
+    """Yield findings as each security group is evaluated."""
+    engine = engine or RuleEngine()
+    return engine.stream(collect(trusted, reachability, context))
+
+
+def scan(trusted=None, reachability=True, context=None, engine=None):
+    return list(iter_scan(trusted, reachability, context, engine))
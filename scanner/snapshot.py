@@ -0,0 +1,145 @@
+"""
+Offline inventory snapshots.
+
+capture() runs each scanner's collection phase and writes the collected
+(resource_type, record) pairs to gzip JSONL files, one per service and
+region. replay() reads them back through the rule engine without any
+AWS calls, so rules can be changed and re-run against a fixed estate.
+
+    python -m scanner.snapshot capture snapshots/2024-06-01
+    python -m scanner.snapshot replay snapshots/2024-06-01
+"""
+import gzip
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+import boto3
+from . import ec2, iam, s3, sg
+from .context import ScanContext
+from .engine import RuleEngine
+
+MANIFEST = 'manifest.json'
+SUFFIX = '.jsonl.gz'
+
+# Services whose collectors take the shared ScanContext.
+CONTEXT_SERVICES = ('ec2', 'sg')
+
+COLLECTORS = {
+    's3': s3.collect,
+    'iam': iam.collect,
+    'ec2': ec2.collect,
+    'sg': sg.collect,
+}
+
+
+def _default_region():
+    return boto3.session.Session().region_name or 'default'
+
+
+class SnapshotWriter:
+    """Appends records to one gzip JSONL file per (service, region)."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.counts = {}
+        self._files = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, service, resource_type, record, region):
+        name = f"{service}-{region}{SUFFIX}"
+        if name not in self._files:
+            self._files[name] = gzip.open(
+                os.path.join(self.directory, name), 'wt', encoding='utf-8'
+            )
+            self.counts[name] = 0
+        self._files[name].write(json.dumps(
+            {'type': resource_type, 'record': record}, default=str
+        ) + '\n')
+        self.counts[name] += 1
+
+    def close(self):
+        for snapshot_file in self._files.values():
+            snapshot_file.close()
+        manifest = {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'files': self.counts,
+        }
+        with open(os.path.join(self.directory, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def capture(directory, services=None, options=None, context=None):
+    """Collect inventory for ``services`` and write it to ``directory``.
+
+    ``options`` maps a service name to keyword arguments for its
+    collector. Returns the number of records written per file.
+    """
+    services = services or list(COLLECTORS)
+    options = options or {}
+    context = context or ScanContext()
+    region = _default_region()
+
+    with SnapshotWriter(directory) as writer:
+        for service in services:
+            kwargs = dict(options.get(service, {}))
+            if service in CONTEXT_SERVICES:
+                kwargs['context'] = context
+            for resource_type, record in COLLECTORS[service](**kwargs):
+                if service == 'iam':
+                    record_region = 'global'
+                else:
+                    # S3 records carry the bucket's own region
+                    record_region = record.get('Region') or region
+                writer.write(service, resource_type, record, record_region)
+    return writer.counts
+
+
+def load(directory, services=None):
+    """Yield (resource_type, record) pairs from a snapshot directory."""
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(SUFFIX):
+            continue
+        service = name.split('-', 1)[0]
+        if services and service not in services:
+            continue
+        with gzip.open(os.path.join(directory, name), 'rt',
+                       encoding='utf-8') as snapshot_file:
+            for line in snapshot_file:
+                entry = json.loads(line)
+                yield entry['type'], entry['record']
+
+
+def replay(directory, services=None, engine=None):
+    """Evaluate a snapshot against the current rules, yielding findings."""
+    engine = engine or RuleEngine()
+    return engine.stream(load(directory, services))
+
+
+def main(argv):
+    if len(argv) != 2 or argv[0] not in ('capture', 'replay'):
+        print("Usage: python -m scanner.snapshot capture|replay DIRECTORY")
+        return 2
+
+    command, directory = argv
+    if command == 'capture':
+        for name, count in capture(directory).items():
+            print(f"{name}: {count} records")
+        return 0
+
+    engine = RuleEngine()
+    findings = replay(directory, engine=engine)
+    print(json.dumps([f.as_dict() for f in findings], indent=2, default=str))
+    print(engine.summary(), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,104 @@
+"""
+Incremental scan state.
+
+Each resource is fingerprinted from cheap list-level metadata such as
+creation dates, attachment state or policy version IDs. The result of
+the expensive per-resource calls is stored next to the fingerprint in a
+local SQLite database. While the fingerprint is unchanged, later scans
+reuse the stored result instead of calling AWS again. Every entry is
+refreshed anyway once it is older than ``full_refresh_seconds``.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+# Force a full refresh of every resource at least once a day.
+DEFAULT_FULL_REFRESH_SECONDS = 24 * 60 * 60
+
+# Saved entries are committed in batches of this size.
+COMMIT_EVERY = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    service TEXT NOT NULL,
+    resource_id TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    refreshed_at REAL NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (service, resource_id)
+)
+"""
+
+
+def fingerprint(metadata):
+    """Stable hash of a resource's list-level metadata."""
+    canonical = json.dumps(metadata, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class StateStore:
+    """SQLite store of per-resource fingerprints and collected results."""
+
+    def __init__(self, path,
+                 full_refresh_seconds=DEFAULT_FULL_REFRESH_SECONDS):
+        self.path = path
+        self.full_refresh_seconds = full_refresh_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(SCHEMA)
+        self._db.commit()
+        self._pending = 0
+        self.counts = {'reused': 0, 'refreshed': 0}
+
+    def lookup(self, service, resource_id, metadata):
+        """Return (fingerprint, stored value or None) for a resource.
+
+        The stored value is only returned when the fingerprint matches
+        and the entry is younger than the full refresh interval.
+        """
+        digest = fingerprint(metadata)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fingerprint, refreshed_at, value FROM resources "
+                "WHERE service = ? AND resource_id = ?",
+                (service, resource_id)
+            ).fetchone()
+            fresh = (
+                row is not None and row[0] == digest and
+                time.time() - row[1] < self.full_refresh_seconds
+            )
+            self.counts['reused' if fresh else 'refreshed'] += 1
+        if not fresh:
+            return digest, None
+        return digest, json.loads(row[2])
+
+    def save(self, service, resource_id, digest, value):
+        """Store the collected value of a resource under its fingerprint."""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO resources "
+                "(service, resource_id, fingerprint, refreshed_at, value) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (service, resource_id, digest, time.time(),
+                 json.dumps(value, default=str))
+            )
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._db.commit()
+                self._pending = 0
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+            self._pending = 0
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
@@ -0,0 +1,42 @@
+from unittest.mock import patch
+from scanner.clients import ClientFactory
+from scanner.context import ScanContext
+
+
+def test_client_factory_reuses_clients_per_key():
+    factory = ClientFactory(max_pool_connections=20)
+    with patch('boto3.client') as mock_client:
+        first = factory.client('ec2', 'us-east-1')
+        assert factory.client('ec2', 'us-east-1') is first
+        factory.client('ec2', 'eu-west-1')
+        factory.client('ec2', 'us-east-1', account='111111111111')
+
+    assert mock_client.call_count == 3
+    assert len(factory) == 3
+    config = mock_client.call_args.kwargs['config']
+    assert config.max_pool_connections == 20
+    assert config.retries == {'mode': 'standard', 'max_attempts': 10}
+
+
+def test_client_factory_rebuilds_on_new_credentials():
+    factory = ClientFactory()
+    with patch('boto3.client') as mock_client:
+        factory.client('s3', credentials={'aws_access_key_id': 'OLD'},
+                       account='111111111111')
+        factory.client('s3', credentials={'aws_access_key_id': 'OLD'},
+                       account='111111111111')
+        factory.client('s3', credentials={'aws_access_key_id': 'NEW'},
+                       account='111111111111')
+
+    assert mock_client.call_count == 2
+    assert mock_client.call_args.kwargs['aws_access_key_id'] == 'NEW'
+
+
+def test_scan_contexts_share_a_factory():
+    factory = ClientFactory()
+    with patch('boto3.client') as mock_client:
+        first = ScanContext(clients=factory).client('iam')
+        second = ScanContext(memoize=False, clients=factory).client('iam')
+
+    assert first is second
+    mock_client.assert_called_once()
@@ -0,0 +1,64 @@
+from unittest.mock import Mock, patch
+from scanner import ec2, sg
+from scanner.context import ScanContext
+
+
+def test_scan_context_shares_describe_results():
+    with patch('boto3.client') as mock_client:
+        client = Mock()
+        mock_client.return_value = client
+        client.describe_security_groups.return_value = {
+            'SecurityGroups': [{
+                'GroupId': 'sg-1234567890',
+                'IpPermissions': [{
+                    'FromPort': 22,
+                    'ToPort': 22,
+                    'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
+                }]
+            }]
+        }
+        client.describe_network_interfaces.return_value = {
+            'NetworkInterfaces': []
+        }
+        client.describe_volumes.return_value = {'Volumes': []}
+        client.describe_instances.return_value = {'Reservations': []}
+        client.describe_snapshots.return_value = {'Snapshots': []}
+
+        context = ScanContext()
+        sg.scan(context=context)
+        ec2.scan(context=context)
+
+    mock_client.assert_called_once()
+    assert mock_client.call_args.args == ('ec2',)
+    # Both scanners read the same ENI inventory, fetched once
+    client.describe_network_interfaces.assert_called_once()
+    assert context.stats() == {'hits': 1, 'misses': 1}
+
+
+def test_scan_context_streams_unshared_calls():
+    with patch('boto3.client') as mock_client:
+        client = Mock()
+        mock_client.return_value = client
+        client.describe_volumes.return_value = {'Volumes': [{'VolumeId': 'v'}]}
+
+        context = ScanContext()
+        list(context.items('ec2', 'describe_volumes', 'Volumes'))
+        list(context.items('ec2', 'describe_volumes', 'Volumes'))
+
+    assert client.describe_volumes.call_count == 2
+    assert context.stats() == {'hits': 0, 'misses': 0}
+
+
+def test_scan_context_without_memoize_streams():
+    with patch('boto3.client') as mock_client:
+        client = Mock()
+        mock_client.return_value = client
+        client.describe_volumes.return_value = {'Volumes': [{'VolumeId': 'v'}]}
+
+        context = ScanContext(memoize=False)
+        items = context.items('ec2', 'describe_volumes', 'Volumes')
+        client.describe_volumes.assert_not_called()
+        assert list(items) == [{'VolumeId': 'v'}]
+        list(context.items('ec2', 'describe_volumes', 'Volumes'))
+
+    assert client.describe_volumes.call_count == 2
@@ -1,5 +1,6 @@
 import pytest
 from unittest.mock import Mock, patch
+from scanner.context import ScanContext
 from scanner.ec2 import scan
 
 
@@ -7,6 +8,10 @@ from scanner.ec2 import scan
 def mock_ec2_client():
     with patch('boto3.client') as mock_client:
         ec2 = Mock()
+        ec2.describe_volumes.return_value = {'Volumes': []}
+        ec2.describe_network_interfaces.return_value = {
+            'NetworkInterfaces': []
+        }
         mock_client.return_value = ec2
         yield ec2
 
@@ -124,3 +129,197 @@ def test_scan_ec2_public_snapshot(mock_ec2_client):
         f['issue'] == 'Snapshot is publicly accessible'
         for f in findings
     )
+
+
+def test_scan_ec2_volumes_fetched_in_bulk(mock_ec2_client):
+    # Setup mock response
+    mock_ec2_client.describe_instances.return_value = {
+        'Reservations': [{
+            'Instances': [{
+                'InstanceId': f'i-{i}',
+                'NetworkInterfaces': [],
+                'BlockDeviceMappings': [{
+                    'Ebs': {'VolumeId': f'vol-{i}'}
+                }]
+            } for i in range(3)]
+        }]
+    }
+    mock_ec2_client.describe_volumes.side_effect = [
+        {
+            'Volumes': [
+                {'VolumeId': 'vol-0', 'Encrypted': False, 'State': 'in-use'},
+                {'VolumeId': 'vol-1', 'Encrypted': True, 'State': 'in-use'}
+            ],
+            'NextToken': 'page-2'
+        },
+        {
+            'Volumes': [
+                {'VolumeId': 'vol-2', 'Encrypted': False, 'State': 'in-use'},
+                {'VolumeId': 'vol-9', 'Encrypted': False,
+                 'State': 'available'}
+            ]
+        }
+    ]
+    mock_ec2_client.describe_snapshots.return_value = {
+        'Snapshots': []
+    }
+
+    # Run scan
+    findings = scan()
+
+    # Assert
+    assert mock_ec2_client.describe_volumes.call_count == 2
+    assert (
+        mock_ec2_client.describe_volumes.call_args.kwargs['NextToken'] ==
+        'page-2'
+    )
+    volume_findings = [
+        f['resource'] for f in findings if f['type'] == 'EC2 Volume'
+    ]
+    assert volume_findings == ['i-0 - vol-0', 'i-2 - vol-2', 'vol-9']
+    assert any(
+        f['issue'] == 'Unattached volume is not encrypted'
+        for f in findings
+    )
+
+
+def test_scan_ec2_public_snapshot_single_call(mock_ec2_client):
+    # Setup mock response
+    mock_ec2_client.describe_instances.return_value = {
+        'Reservations': []
+    }
+    mock_ec2_client.describe_snapshots.return_value = {
+        'Snapshots': [{'SnapshotId': 'snap-public'}]
+    }
+
+    # Run scan
+    findings = scan()
+
+    # Assert
+    mock_ec2_client.describe_snapshots.assert_called_once_with(
+        OwnerIds=['self'], RestorableByUserIds=['all'], MaxResults=1000
+    )
+    mock_ec2_client.describe_snapshot_attribute.assert_not_called()
+    assert [f['resource'] for f in findings] == ['snap-public']
+
+
+def test_scan_ec2_public_snapshot_deep_verification(mock_ec2_client):
+    # Setup mock response
+    mock_ec2_client.describe_instances.return_value = {
+        'Reservations': []
+    }
+    mock_ec2_client.describe_snapshots.return_value = {
+        'Snapshots': [
+            {'SnapshotId': 'snap-private'},
+            {'SnapshotId': 'snap-public'}
+        ]
+    }
+    mock_ec2_client.describe_snapshot_attribute.side_effect = [
+        {'CreateVolumePermissions': []},
+        {'CreateVolumePermissions': [{'Group': 'all'}]}
+    ]
+
+    # Run scan
+    findings = scan(verify_snapshots=True)
+
+    # Assert
+    assert mock_ec2_client.describe_snapshot_attribute.call_count == 2
+    assert [f['resource'] for f in findings] == ['snap-public']
+
+
+def test_scan_ec2_reads_every_instance_page(mock_ec2_client):
+    # Setup mock response
+    mock_ec2_client.describe_instances.side_effect = [
+        {
+            'Reservations': [{
+                'Instances': [{
+                    'InstanceId': 'i-page1',
+                    'NetworkInterfaces': [{
+                        'Association': {'PublicIp': '1.2.3.4'}
+                    }]
+                }]
+            }],
+            'NextToken': 'page-2'
+        },
+        {
+            'Reservations': [{
+                'Instances': [{
+                    'InstanceId': 'i-page2',
+                    'NetworkInterfaces': [{
+                        'Association': {'PublicIp': '5.6.7.8'}
+                    }]
+                }]
+            }]
+        }
+    ]
+    mock_ec2_client.describe_instance_attribute.return_value = {
+        'DisableApiTermination': {'Value': True}
+    }
+    mock_ec2_client.describe_snapshots.return_value = {
+        'Snapshots': []
+    }
+
+    # Run scan
+    findings = scan()
+
+    # Assert
+    assert [
+        f['resource'] for f in findings
+        if f['issue'] == 'Instance has public IP'
+    ] == ['i-page1', 'i-page2']
+
+
+def test_scan_ec2_public_ip_from_shared_network_interfaces(
+        mock_ec2_client):
+    # Setup mock response
+    mock_ec2_client.describe_instances.return_value = {
+        'Reservations': [{
+            'Instances': [{'InstanceId': 'i-1234567890'}]
+        }]
+    }
+    mock_ec2_client.describe_network_interfaces.return_value = {
+        'NetworkInterfaces': [{
+            'NetworkInterfaceId': 'eni-1',
+            'Attachment': {'InstanceId': 'i-1234567890'},
+            'Association': {'PublicIp': '1.2.3.4'}
+        }]
+    }
+    mock_ec2_client.describe_instance_attribute.return_value = {
+        'DisableApiTermination': {'Value': True}
+    }
+    mock_ec2_client.describe_snapshots.return_value = {'Snapshots': []}
+
+    # Run scan
+    findings = scan(context=ScanContext())
+
+    # Assert
+    assert [(f['resource'], f['issue']) for f in findings] == [
+        ('i-1234567890', 'Instance has public IP')
+    ]
+
+
+def test_scan_ec2_alone_does_not_list_network_interfaces(mock_ec2_client):
+    # Setup mock response
+    mock_ec2_client.describe_instances.return_value = {
+        'Reservations': [{
+            'Instances': [{
+                'InstanceId': 'i-1234567890',
+                'NetworkInterfaces': [{
+                    'Association': {'PublicIp': '1.2.3.4'}
+                }]
+            }]
+        }]
+    }
+    mock_ec2_client.describe_instance_attribute.return_value = {
+        'DisableApiTermination': {'Value': True}
+    }
+    mock_ec2_client.describe_snapshots.return_value = {'Snapshots': []}
+
+    # Run scan
+    findings = scan()
+
+    # Assert
+    mock_ec2_client.describe_network_interfaces.assert_not_called()
+    assert [(f['resource'], f['issue']) for f in findings] == [
+        ('i-1234567890', 'Instance has public IP')
+    ]
@@ -0,0 +1,40 @@
+import pytest
+from scanner import engine, sg  # noqa: F401 - registers the SG rules
+from scanner.engine import Rule, RuleEngine
+
+
+def test_rules_follow_the_catalog_resource_types():
+    assert engine.registry['sg_ssh_open'].resource_type == 'security_group'
+    assert engine.registry['s3_public_access'].resource_type == 's3_bucket'
+    with pytest.raises(ValueError):
+        Rule('not_a_rule', lambda record: [])
+
+
+def test_engine_fills_in_rule_metadata_and_stats():
+    def open_bucket(record):
+        if record['Public']:
+            yield {
+                "resource": record['Name'],
+                "type": "S3 Bucket",
+                "issue": "Bucket is public",
+                "extra": 1
+            }
+
+    rule_engine = RuleEngine({
+        's3_public_access': Rule('s3_public_access', open_bucket)
+    })
+    findings = rule_engine.run([
+        ('s3_bucket', {'Name': 'open', 'Public': True}),
+        ('s3_bucket', {'Name': 'closed', 'Public': False}),
+        ('ec2_instance', {'InstanceId': 'i-1234567890abcdef0'}),
+    ])
+
+    assert len(findings) == 1
+    assert findings[0]['resource'] == 'open'
+    assert findings[0]['risk'] == 'HIGH'
+    assert findings[0]['cis_rule'].startswith('CIS')
+    assert findings[0]['extra'] == 1
+    stats = rule_engine.stats()
+    assert list(stats) == ['s3_public_access']
+    assert stats['s3_public_access']['evaluated'] == 2
+    assert stats['s3_public_access']['findings'] == 1
@@ -0,0 +1,125 @@
+import gzip
+import json
+from unittest.mock import Mock, patch
+from scanner.events import affected_resources, iter_directory, process
+
+
+def _write_events(directory):
+    trail = {'Records': [
+        {
+            'eventName': 'AuthorizeSecurityGroupIngress',
+            'awsRegion': 'us-east-1',
+            'requestParameters': {'groupId': 'sg-1234567890'}
+        },
+        {
+            'eventName': 'DescribeInstances',
+            'readOnly': True,
+            'requestParameters': {'instanceId': 'i-1234567890abcdef0'}
+        },
+        {
+            'eventName': 'PutBucketAcl',
+            'errorCode': 'AccessDenied',
+            'requestParameters': {'bucketName': 'denied-bucket'}
+        },
+    ]}
+    with gzip.open(directory / 'trail.json.gz', 'wt') as f:
+        json.dump(trail, f)
+    bridge = {
+        'detail-type': 'AWS API Call via CloudTrail',
+        'detail': {
+            'eventName': 'PutBucketAcl',
+            'requestParameters': {'bucketName': 'test-bucket'}
+        }
+    }
+    (directory / 'bridge.jsonl').write_text(json.dumps(bridge) + '\n')
+
+
+def test_affected_resources_from_event_files(tmp_path):
+    _write_events(tmp_path)
+
+    assert affected_resources(iter_directory(str(tmp_path))) == {
+        'us-east-1': {'security_group': ['sg-1234567890']},
+        None: {'s3_bucket': ['test-bucket']},
+    }
+
+
+def test_process_rescans_only_affected_resources(tmp_path):
+    _write_events(tmp_path)
+    with patch('boto3.client') as mock_client:
+        client = Mock()
+        mock_client.return_value = client
+        client.get_bucket_location.return_value = {'LocationConstraint': None}
+        client.get_bucket_acl.return_value = {
+            'Grants': [{
+                'Grantee': {
+                    'URI': 'http://acs.amazonaws.com/groups/global/AllUsers'
+                },
+                'Permission': 'READ'
+            }]
+        }
+        client.get_bucket_versioning.return_value = {'Status': 'Enabled'}
+        client.get_bucket_logging.return_value = {
+            'LoggingEnabled': {'TargetBucket': 'logs'}
+        }
+        client.get_bucket_encryption.return_value = {
+            'ServerSideEncryptionConfiguration': {'Rules': []}
+        }
+        client.describe_security_groups.return_value = {
+            'SecurityGroups': [{
+                'GroupId': 'sg-1234567890',
+                'IpPermissions': [{
+                    'IpProtocol': 'tcp',
+                    'FromPort': 3389,
+                    'ToPort': 3389,
+                    'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
+                }]
+            }]
+        }
+        client.describe_network_interfaces.return_value = {
+            'NetworkInterfaces': []
+        }
+
+        findings = list(process(iter_directory(str(tmp_path))))
+
+    client.list_buckets.assert_not_called()
+    client.describe_instances.assert_not_called()
+    client.describe_security_groups.assert_called_once_with(
+        GroupIds=['sg-1234567890']
+    )
+    assert [(f['resource'], f['issue']) for f in findings] == [
+        ('test-bucket', 'Bucket is publicly accessible'),
+        ('sg-1234567890', 'Open to the world on port 3389'),
+    ]
+
+
+def test_process_rescans_each_event_in_its_region():
+    records = [{
+        'eventName': 'AuthorizeSecurityGroupIngress',
+        'awsRegion': 'eu-west-1',
+        'requestParameters': {'groupId': 'sg-eu'}
+    }]
+    clients = {}
+
+    def make_client(service, region_name=None, config=None):
+        return clients.setdefault(region_name, Mock())
+
+    with patch('boto3.client', side_effect=make_client):
+        assert affected_resources(records) == {
+            'eu-west-1': {'security_group': ['sg-eu']}
+        }
+        make_client('ec2', 'eu-west-1').describe_security_groups \
+            .return_value = {'SecurityGroups': [{
+                'GroupId': 'sg-eu',
+                'IpPermissions': [{
+                    'IpProtocol': 'tcp',
+                    'FromPort': 22,
+                    'ToPort': 22,
+                    'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
+                }]
+            }]}
+        findings = list(process(records, reachability=False))
+
+    assert list(clients) == ['eu-west-1']
+    assert [(f['resource'], f['issue']) for f in findings] == [
+        ('sg-eu', 'Open to the world on port 22'),
+    ]
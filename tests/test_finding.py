@@ -0,0 +1,68 @@
+import io
+import json
+import pytest
+from scanner.finding import (
+    Finding, from_document, to_document, write_document
+)
+from scanner.rules import cis_rules
+
+
+def test_finding_reads_like_the_legacy_dict():
+    finding = Finding(
+        'sg_ssh_open', 'sg-1234567890', 'Security Group',
+        'Port 22 open to 0.0.0.0/0', risk='LOW',
+        extra={'attachments': 0}
+    )
+
+    assert finding['risk'] == 'LOW'
+    assert finding['cis_rule'] is cis_rules['sg_ssh_open']['cis_rule']
+    assert finding.get('details') is None
+    assert finding.as_dict() == {
+        'resource': 'sg-1234567890',
+        'type': 'Security Group',
+        'risk': 'LOW',
+        'issue': 'Port 22 open to 0.0.0.0/0',
+        'cis_rule': cis_rules['sg_ssh_open']['cis_rule'],
+        'remediation': cis_rules['sg_ssh_open']['remediation'],
+        'attachments': 0
+    }
+    assert not hasattr(finding, '__dict__')
+    with pytest.raises(ValueError):
+        Finding('not_a_rule', 'r', 't', 'i')
+
+
+def test_document_lists_each_rule_once():
+    findings = [
+        Finding('s3_versioning_disabled', f'bucket-{i}', 'S3 Bucket',
+                'Bucket versioning is not enabled')
+        for i in range(3)
+    ]
+
+    document = json.loads(json.dumps(to_document(findings)))
+
+    assert list(document['rules']) == ['s3_versioning_disabled']
+    assert document['findings'][0] == {
+        'resource': 'bucket-0',
+        'type': 'S3 Bucket',
+        'risk': cis_rules['s3_versioning_disabled']['risk_level'],
+        'issue': 'Bucket versioning is not enabled',
+        'rule': 's3_versioning_disabled'
+    }
+    assert from_document(document) == [f.as_dict() for f in findings]
+
+
+def test_write_document_streams_findings():
+    findings = (
+        Finding('sg_ssh_open', f'sg-{i}', 'Security Group', 'Port 22 open')
+        for i in range(3)
+    )
+    out = io.StringIO()
+
+    def redact(finding, compact):
+        compact['resource'] = 'REDACTED'
+        return compact
+
+    assert write_document(findings, out, transform=redact) == 3
+    document = json.loads(out.getvalue())
+    assert list(document['rules']) == ['sg_ssh_open']
+    assert [f['resource'] for f in document['findings']] == ['REDACTED'] * 3
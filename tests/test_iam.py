@@ -1,6 +1,8 @@
 import pytest
+from datetime import datetime, timedelta, timezone
 from unittest.mock import Mock, patch
-from scanner.iam import scan
+from scanner.iam import PolicyCache, scan
+from scanner.state import StateStore
 
 
 @pytest.fixture
@@ -120,3 +122,360 @@ def test_scan_iam_password_policy(mock_iam_client):
         f['issue'] == 'Password policy does not require uppercase letters'
         for f in findings
     )
+
+
+def test_scan_iam_bulk_collection(mock_iam_client):
+    # Setup mock response
+    admin_arn = 'arn:aws:iam::aws:policy/AdministratorAccess'
+    admin_doc = {
+        'Statement': [{'Effect': 'Allow', 'Action': '*', 'Resource': '*'}]
+    }
+    mock_iam_client.get_account_authorization_details.side_effect = [
+        {
+            'UserDetailList': [{
+                'UserName': 'testuser',
+                'UserPolicyList': [],
+                'AttachedManagedPolicies': [{
+                    'PolicyName': 'AdministratorAccess',
+                    'PolicyArn': admin_arn
+                }]
+            }],
+            'GroupDetailList': [{
+                'GroupName': 'admins',
+                'GroupPolicyList': [{
+                    'PolicyName': 'inline-admin',
+                    'PolicyDocument': admin_doc
+                }],
+                'AttachedManagedPolicies': []
+            }],
+            'IsTruncated': True,
+            'Marker': 'page-2'
+        },
+        {
+            'RoleDetailList': [{
+                'RoleName': 'deploy',
+                'RolePolicyList': [],
+                'AttachedManagedPolicies': [{
+                    'PolicyName': 'AdministratorAccess',
+                    'PolicyArn': admin_arn
+                }]
+            }],
+            'Policies': [{
+                'Arn': admin_arn,
+                'PolicyVersionList': [
+                    {'IsDefaultVersion': False, 'Document': {}},
+                    {'IsDefaultVersion': True, 'Document': admin_doc}
+                ]
+            }]
+        }
+    ]
+    mock_iam_client.list_mfa_devices.return_value = {
+        'MFADevices': [{'SerialNumber': 'test-mfa'}]
+    }
+    mock_iam_client.list_access_keys.return_value = {
+        'AccessKeyMetadata': []
+    }
+    mock_iam_client.get_account_password_policy.return_value = {
+        'PasswordPolicy': {
+            'RequireUppercaseCharacters': True
+        }
+    }
+
+    # Run scan
+    findings = scan(collection='bulk')
+
+    # Assert
+    mock_iam_client.list_users.assert_not_called()
+    mock_iam_client.get_policy_version.assert_not_called()
+    assert [(f['resource'], f['type'], f['issue']) for f in findings] == [
+        (
+            'testuser', 'IAM User',
+            'Attached policy AdministratorAccess is overly permissive'
+        ),
+        ('admins', 'IAM Group', 'Inline policy is overly permissive'),
+        (
+            'deploy', 'IAM Role',
+            'Attached policy AdministratorAccess is overly permissive'
+        ),
+    ]
+
+
+def test_scan_iam_credential_report(mock_iam_client):
+    # Setup mock response
+    header = (
+        'user,mfa_active,access_key_1_active,access_key_1_last_rotated,'
+        'access_key_2_active,access_key_2_last_rotated\n'
+    )
+    rows = (
+        '<root_account>,true,true,2024-01-01T00:00:00+00:00,false,N/A\n'
+        'old-keys,true,true,2020-01-01T00:00:00+00:00,false,N/A\n'
+        'no-mfa,false,false,N/A,false,N/A\n'
+    )
+    mock_iam_client.generate_credential_report.return_value = {
+        'State': 'COMPLETE'
+    }
+    mock_iam_client.get_credential_report.return_value = {
+        'Content': (header + rows).encode('utf-8')
+    }
+    mock_iam_client.list_users.return_value = {
+        'Users': [{'UserName': 'old-keys'}, {'UserName': 'no-mfa'}]
+    }
+    mock_iam_client.list_user_policies.return_value = {
+        'PolicyNames': []
+    }
+    mock_iam_client.list_attached_user_policies.return_value = {
+        'AttachedPolicies': []
+    }
+    mock_iam_client.get_account_password_policy.return_value = {
+        'PasswordPolicy': {
+            'RequireUppercaseCharacters': True
+        }
+    }
+
+    # Run scan
+    findings = scan(credentials='report')
+
+    # Assert
+    mock_iam_client.list_mfa_devices.assert_not_called()
+    mock_iam_client.list_access_keys.assert_not_called()
+    assert [(f['resource'], f['issue']) for f in findings] == [
+        (
+            '<root_account> - access_key_1',
+            'Root account has an active access key'
+        ),
+        (
+            'old-keys - access_key_1',
+            'Access key not rotated in 90 days'
+        ),
+        ('no-mfa', 'User does not have MFA enabled'),
+    ]
+
+
+def test_scan_iam_api_keys_use_the_rotation_age(mock_iam_client):
+    # Setup mock response
+    now = datetime.now(timezone.utc)
+    mock_iam_client.list_users.return_value = {
+        'Users': [{'UserName': 'testuser'}]
+    }
+    mock_iam_client.list_mfa_devices.return_value = {
+        'MFADevices': [{'SerialNumber': 'test-mfa'}]
+    }
+    mock_iam_client.list_access_keys.return_value = {
+        'AccessKeyMetadata': [
+            {'AccessKeyId': 'AKIAOLD', 'Status': 'Active',
+             'CreateDate': now - timedelta(days=200)},
+            {'AccessKeyId': 'AKIANEW', 'Status': 'Active',
+             'CreateDate': now - timedelta(days=10)},
+        ]
+    }
+    mock_iam_client.list_user_policies.return_value = {'PolicyNames': []}
+    mock_iam_client.list_attached_user_policies.return_value = {
+        'AttachedPolicies': []
+    }
+    mock_iam_client.get_account_password_policy.return_value = {
+        'PasswordPolicy': {
+            'RequireUppercaseCharacters': True
+        }
+    }
+
+    # Run scan
+    findings = scan()
+
+    # Assert: the same 90-day check as the credential report
+    assert [(f['resource'], f['issue']) for f in findings] == [
+        ('testuser - AKIAOLD', 'Access key not rotated in 90 days'),
+    ]
+
+
+def test_scan_iam_managed_policy_fetched_once(mock_iam_client):
+    # Setup mock response
+    mock_iam_client.list_users.return_value = {
+        'Users': [{'UserName': f'user-{i}'} for i in range(5)]
+    }
+    mock_iam_client.list_mfa_devices.return_value = {
+        'MFADevices': [{'SerialNumber': 'test-mfa'}]
+    }
+    mock_iam_client.list_access_keys.return_value = {
+        'AccessKeyMetadata': []
+    }
+    mock_iam_client.list_user_policies.return_value = {
+        'PolicyNames': []
+    }
+    mock_iam_client.list_attached_user_policies.return_value = {
+        'AttachedPolicies': [{
+            'PolicyName': 'AdministratorAccess',
+            'PolicyArn': 'arn:aws:iam::aws:policy/AdministratorAccess'
+        }]
+    }
+    mock_iam_client.get_policy.return_value = {
+        'Policy': {'DefaultVersionId': 'v1'}
+    }
+    mock_iam_client.get_policy_version.return_value = {
+        'PolicyVersion': {
+            'Document': {
+                'Statement': [{
+                    'Effect': 'Allow',
+                    'Action': '*',
+                    'Resource': '*'
+                }]
+            }
+        }
+    }
+    mock_iam_client.get_account_password_policy.return_value = {
+        'PasswordPolicy': {
+            'RequireUppercaseCharacters': True
+        }
+    }
+
+    # Run scan
+    cache = PolicyCache()
+    findings = scan(policy_cache=cache)
+
+    # Assert
+    assert len(findings) == 5
+    mock_iam_client.get_policy.assert_called_once()
+    mock_iam_client.get_policy_version.assert_called_once()
+    stats = cache.stats()
+    assert stats['document_hits'] == 4
+    assert stats['document_misses'] == 1
+    # Counted for this scan only, whatever earlier scans cached
+    assert stats['verdict_hits'] + stats['verdict_misses'] == 5
+    assert stats['verdict_hits'] >= 4
+
+
+def test_scan_iam_root_without_mfa(mock_iam_client):
+    # Setup mock response
+    mock_iam_client.generate_credential_report.return_value = {
+        'State': 'COMPLETE'
+    }
+    mock_iam_client.get_credential_report.return_value = {
+        'Content': (
+            'user,mfa_active,access_key_1_active,access_key_1_last_rotated,'
+            'access_key_2_active,access_key_2_last_rotated\n'
+            '<root_account>,false,false,N/A,false,N/A\n'
+        ).encode('utf-8')
+    }
+    mock_iam_client.list_users.return_value = {'Users': []}
+    mock_iam_client.get_account_password_policy.return_value = {
+        'PasswordPolicy': {
+            'RequireUppercaseCharacters': True
+        }
+    }
+
+    # Run scan
+    findings = scan(credentials='report')
+
+    # Assert
+    assert [(f['resource'], f['issue']) for f in findings] == [
+        ('<root_account>', 'Root account does not have MFA enabled'),
+    ]
+
+
+def test_scan_iam_state_tracks_policy_changes(mock_iam_client, tmp_path):
+    # Setup mock response
+    mock_iam_client.list_users.return_value = {
+        'Users': [{'UserName': 'alice', 'UserId': 'AIDA1'}]
+    }
+    mock_iam_client.list_mfa_devices.return_value = {'MFADevices': []}
+    mock_iam_client.list_access_keys.return_value = {
+        'AccessKeyMetadata': []
+    }
+    mock_iam_client.list_user_policies.return_value = {'PolicyNames': []}
+    mock_iam_client.list_attached_user_policies.return_value = {
+        'AttachedPolicies': []
+    }
+    mock_iam_client.list_policies.return_value = {
+        'Policies': [{
+            'Arn': 'arn:aws:iam::aws:policy/AdministratorAccess',
+            'DefaultVersionId': 'v1'
+        }]
+    }
+    mock_iam_client.get_policy_version.return_value = {
+        'PolicyVersion': {
+            'Document': {
+                'Statement': [{
+                    'Effect': 'Allow',
+                    'Action': '*',
+                    'Resource': '*'
+                }]
+            }
+        }
+    }
+    mock_iam_client.get_account_password_policy.return_value = {
+        'PasswordPolicy': {
+            'RequireUppercaseCharacters': True
+        }
+    }
+    state = StateStore(str(tmp_path / 'state.db'))
+
+    # Run scan
+    first = scan(state=state)
+    second = scan(state=state)
+    mock_iam_client.list_attached_user_policies.return_value = {
+        'AttachedPolicies': [{
+            'PolicyName': 'AdministratorAccess',
+            'PolicyArn': 'arn:aws:iam::aws:policy/AdministratorAccess'
+        }]
+    }
+    mock_iam_client.list_mfa_devices.return_value = {
+        'MFADevices': [{'SerialNumber': 'test-mfa'}]
+    }
+    third = scan(state=state)
+
+    # Assert
+    assert second == first
+    assert state.stats() == {'reused': 1, 'refreshed': 2}
+    assert [f['issue'] for f in third] == [
+        'Attached policy AdministratorAccess is overly permissive'
+    ]
+    # The default version came from list_policies
+    mock_iam_client.get_policy.assert_not_called()
+    assert mock_iam_client.list_mfa_devices.call_count == 3
+
+
+def test_scan_iam_state_rereads_inline_policies(mock_iam_client, tmp_path):
+    # Setup mock response
+    mock_iam_client.list_users.return_value = {
+        'Users': [{'UserName': f'user-{i}', 'UserId': f'AIDA{i}'}
+                  for i in range(3)]
+    }
+    mock_iam_client.list_mfa_devices.return_value = {
+        'MFADevices': [{'SerialNumber': 'test-mfa'}]
+    }
+    mock_iam_client.list_access_keys.return_value = {
+        'AccessKeyMetadata': []
+    }
+    mock_iam_client.list_user_policies.return_value = {
+        'PolicyNames': ['inline']
+    }
+    mock_iam_client.list_attached_user_policies.return_value = {
+        'AttachedPolicies': []
+    }
+    mock_iam_client.list_policies.return_value = {'Policies': []}
+    mock_iam_client.get_user_policy.return_value = {
+        'PolicyDocument': {'Statement': [{'Effect': 'Deny'}]}
+    }
+    mock_iam_client.get_account_password_policy.return_value = {
+        'PasswordPolicy': {
+            'RequireUppercaseCharacters': True
+        }
+    }
+    state = StateStore(str(tmp_path / 'state.db'))
+
+    # Run scan
+    assert scan(state=state) == []
+    # The policy keeps its name but now allows everything
+    mock_iam_client.get_user_policy.return_value = {
+        'PolicyDocument': {
+            'Statement': [{'Effect': 'Allow', 'Action': '*', 'Resource': '*'}]
+        }
+    }
+    second = scan(state=state)
+
+    # Assert
+    assert [(f['resource'], f['issue']) for f in second] == [
+        (f'user-{i}', 'Inline policy is overly permissive') for i in range(3)
+    ]
+    # Each user's policies are listed once per scan
+    assert mock_iam_client.list_user_policies.call_count == 6
+    assert mock_iam_client.list_attached_user_policies.call_count == 6
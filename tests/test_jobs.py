@@ -0,0 +1,144 @@
+import threading
+import time
+from contextlib import contextmanager
+from scanner.jobs import COMPLETED, FAILED, JobManager
+
+
+def _wait(job, timeout=5):
+    for _ in range(int(timeout / 0.01)):
+        if job.done:
+            return
+        time.sleep(0.01)
+    raise AssertionError(f"job still {job.state}")
+
+
+def test_job_runs_scanners_and_reports_timings():
+    manager = JobManager(max_workers=1)
+    completed = []
+    job = manager.submit(
+        {'s3': lambda state: ['a', 'b'], 'iam': lambda state: ['c']},
+        on_complete=completed.append
+    )
+    _wait(job)
+
+    status = job.status()
+    assert status['status'] == COMPLETED
+    assert status['progress'] == 100
+    assert status['findings'] == 3
+    assert status['scanners']['s3']['findings'] == 2
+    assert status['scanners']['iam']['status'] == 'done'
+    assert status['scanners']['iam']['seconds'] is not None
+    assert completed == [['a', 'b', 'c']]
+    assert manager.get(job.id) is job
+    manager.shutdown()
+
+
+def test_identical_jobs_in_flight_are_deduplicated():
+    manager = JobManager(max_workers=1)
+    release = threading.Event()
+
+    def blocked(state):
+        release.wait(5)
+        return []
+
+    first = manager.submit({'s3': blocked})
+    assert manager.submit({'s3': blocked}) is first
+    other = manager.submit({'iam': lambda state: []})
+    assert other is not first
+
+    release.set()
+    _wait(first)
+    _wait(other)
+    # Once finished, the same scan starts a new job
+    again = manager.submit({'s3': blocked})
+    assert again is not first
+    _wait(again)
+    manager.shutdown()
+
+
+def test_failed_scanner_does_not_stop_the_job():
+    manager = JobManager(max_workers=1)
+    completed = []
+
+    def broken(state):
+        raise RuntimeError('AccessDenied')
+
+    job = manager.submit(
+        {'s3': broken, 'iam': lambda state: ['c']},
+        on_complete=completed.append
+    )
+    _wait(job)
+    status = job.status()
+    assert status['status'] == COMPLETED
+    assert status['scanners']['s3'] == {
+        'status': 'failed', 'seconds': status['scanners']['s3']['seconds'],
+        'findings': 0, 'error': 'AccessDenied'
+    }
+    assert completed == [['c']]
+
+    job = manager.submit({'s3': broken}, on_complete=completed.append)
+    _wait(job)
+    assert job.state == FAILED
+    assert len(completed) == 1
+    manager.shutdown()
+
+
+def test_job_scope_is_entered_once_and_passed_to_scanners():
+    manager = JobManager(max_workers=1)
+    events = []
+
+    @contextmanager
+    def scope():
+        events.append('open')
+        yield 'state'
+        events.append('close')
+
+    job = manager.submit(
+        {'s3': lambda state: events.append(state) or [],
+         'ec2': lambda state: events.append(state) or []},
+        scope=scope
+    )
+    _wait(job)
+    assert events == ['open', 'state', 'state', 'close']
+    manager.shutdown()
+
+
+def test_old_finished_jobs_are_dropped():
+    manager = JobManager(max_workers=1, max_finished=2)
+    jobs = []
+    for name in ('a', 'b', 'c'):
+        jobs.append(manager.submit({name: lambda state: []}))
+        _wait(jobs[-1])
+
+    assert manager.get(jobs[0].id) is None
+    assert [j.id for j in manager.jobs()] == [jobs[1].id, jobs[2].id]
+    manager.shutdown()
+
+
+def test_running_scanner_reports_findings_so_far():
+    manager = JobManager(max_workers=1)
+    found = threading.Event()
+    release = threading.Event()
+
+    def slow(state):
+        yield 'a'
+        yield 'b'
+        found.set()
+        release.wait(5)
+        yield 'c'
+
+    job = manager.submit({'s3': slow, 'iam': lambda state: []})
+    assert found.wait(5)
+    status = job.status()
+    assert status['status'] == 'running'
+    assert status['progress'] == 0
+    assert status['findings'] == 2
+    assert status['scanners']['s3'] == {
+        'status': 'running', 'seconds': None, 'findings': 2, 'error': None
+    }
+
+    release.set()
+    _wait(job)
+    assert job.status()['findings'] == 3
+    assert job.results == ['a', 'b', 'c']
+    manager.shutdown()
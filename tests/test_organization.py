@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock, patch
+from scanner.organization import CredentialCache, scan
+
+
+def _assumed(account_id, minutes):
+    return {'Credentials': {
+        'AccessKeyId': f'key-{account_id}',
+        'SecretAccessKey': 'secret',
+        'SessionToken': 'token',
+        'Expiration': datetime.now(timezone.utc) + timedelta(minutes=minutes)
+    }}
+
+
+def test_credential_cache_renews_near_expiry():
+    with patch('boto3.client') as mock_client:
+        sts = Mock()
+        mock_client.return_value = sts
+        sts.assume_role.side_effect = [
+            _assumed('111111111111', 60),
+            _assumed('222222222222', 2),
+            _assumed('222222222222', 60),
+        ]
+        cache = CredentialCache()
+
+        first = cache.credentials('111111111111')
+        assert cache.credentials('111111111111') == first
+        cache.credentials('222222222222')
+        cache.credentials('222222222222')
+
+    assert first['aws_access_key_id'] == 'key-111111111111'
+    assert sts.assume_role.call_count == 3
+    sts.assume_role.assert_any_call(
+        RoleArn='arn:aws:iam::111111111111:role/SecurityAudit',
+        RoleSessionName='aws-security-auditor'
+    )
+
+
+def _account_client(key):
+    client = Mock()
+    client.assume_role.side_effect = (
+        lambda RoleArn, RoleSessionName: _assumed(RoleArn.split(':')[4], 60)
+    )
+    client.describe_security_groups.return_value = {
+        'SecurityGroups': [{
+            'GroupId': f'sg-{key}',
+            'IpPermissions': [{
+                'IpProtocol': 'tcp',
+                'FromPort': 22,
+                'ToPort': 22,
+                'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
+            }]
+        }]
+    }
+    client.describe_network_interfaces.return_value = {
+        'NetworkInterfaces': []
+    }
+    return client
+
+
+def test_scan_tags_findings_by_account():
+    clients = {}
+
+    def make_client(service, aws_access_key_id=None, **kwargs):
+        return clients.setdefault(
+            aws_access_key_id, _account_client(aws_access_key_id)
+        )
+
+    with patch('boto3.client', side_effect=make_client):
+        findings = scan(
+            accounts=['111111111111', '222222222222'], services=('sg',)
+        )
+
+    assert sorted((f['resource'], f['account']) for f in findings) == [
+        ('sg-key-111111111111', '111111111111'),
+        ('sg-key-222222222222', '222222222222'),
+    ]
+
+
+def test_account_scan_switches_to_renewed_credentials():
+    sts = Mock()
+    renewals = iter(range(100))
+    # Every assumed role is already inside the refresh margin
+    sts.assume_role.side_effect = (
+        lambda RoleArn, RoleSessionName: _assumed(next(renewals), 2)
+    )
+    keys = []
+
+    def make_client(service, aws_access_key_id=None, **kwargs):
+        if service == 'sts':
+            return sts
+        keys.append(aws_access_key_id)
+        return _account_client('111111111111')
+
+    with patch('boto3.client', side_effect=make_client):
+        findings = scan(accounts=['111111111111'], services=('sg',))
+
+    assert [f['account'] for f in findings] == ['111111111111']
+    assert sts.assume_role.call_count == len(keys)
+    assert len(set(keys)) > 1
@@ -0,0 +1,73 @@
+import pytest
+from scanner import policy
+
+
+@pytest.mark.parametrize('statement', [
+    {'Effect': 'Allow', 'Action': '*', 'Resource': '*'},
+    {'Effect': 'Allow', 'Action': ['s3:GetObject', '*'], 'Resource': ['*']},
+    {'Effect': 'Allow', 'Action': '*:*', 'Resource': '*'},
+    {'Effect': 'Allow', 'Action': 'iam:*', 'Resource': '*'},
+    {'Effect': 'Allow', 'NotAction': 'iam:*', 'Resource': '*'},
+    {'Effect': 'Allow', 'Action': '*', 'NotResource': 'arn:aws:s3:::x'},
+])
+def test_overly_permissive_statements(statement):
+    assert policy.analyze({'Statement': statement}) == (0,)
+
+
+@pytest.mark.parametrize('statement', [
+    {'Effect': 'Deny', 'Action': '*', 'Resource': '*'},
+    {'Effect': 'Allow', 'Action': 's3:GetObject', 'Resource': '*'},
+    {'Effect': 'Allow', 'Action': 'ec2:Describe*', 'Resource': '*'},
+    {'Effect': 'Allow', 'Action': '*', 'Resource': 'arn:aws:s3:::bucket/*'},
+])
+def test_scoped_statements(statement):
+    assert policy.analyze({'Statement': [statement]}) == ()
+
+
+def test_statement_allows_wildcards():
+    stmt = policy.Statement({
+        'Effect': 'Allow',
+        'Action': ['s3:Get*', 'ec2:Describe?nstances'],
+        'Resource': 'arn:aws:s3:::bucket/*'
+    })
+
+    assert stmt.allows('s3:getobject', 'arn:aws:s3:::bucket/key')
+    assert stmt.allows('ec2:DescribeInstances', 'arn:aws:s3:::bucket/a')
+    assert not stmt.allows('s3:PutObject', 'arn:aws:s3:::bucket/key')
+    assert not stmt.allows('s3:GetObject', 'arn:aws:s3:::other/key')
+    assert stmt.covered_services() == []
+
+
+def test_analyze_documents_deduplicates_and_uses_process_pool(monkeypatch):
+    monkeypatch.setattr(policy, 'LARGE_DOCUMENT_STATEMENTS', 2)
+    monkeypatch.setattr(policy, '_verdicts', {})
+    small = {'Statement': [{'Effect': 'Allow', 'Action': '*',
+                            'Resource': '*'}]}
+    large = {'Statement': [
+        {'Effect': 'Allow', 'Action': 's3:GetObject', 'Resource': '*'},
+        {'Effect': 'Allow', 'Action': 'iam:*', 'Resource': '*'},
+    ]}
+
+    results = policy.analyze_documents([small, large, dict(small)],
+                                       processes=1)
+
+    assert results == {
+        policy.document_digest(small): (0,),
+        policy.document_digest(large): (1,),
+    }
+    assert policy.analyze(large) == (1,)
+
+
+def test_analyze_counts_into_the_callers_counters():
+    doc = {'Statement': [{
+        'Effect': 'Allow', 'Action': 'iam:PassRole', 'Resource': 'arn:x'
+    }]}
+    first = {'verdict_hits': 0, 'verdict_misses': 0}
+    second = {'verdict_hits': 0, 'verdict_misses': 0}
+
+    policy.analyze(doc, counts=first)
+    policy.analyze(doc, counts=second)
+    policy.analyze(doc)
+
+    assert first == {'verdict_hits': 0, 'verdict_misses': 1}
+    assert second == {'verdict_hits': 1, 'verdict_misses': 0}
@@ -0,0 +1,115 @@
+from unittest.mock import patch
+
+import boto3
+import pytest
+from botocore.awsrequest import AWSResponse
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from scanner.clients import ClientFactory
+from scanner.ratelimit import RateLimiter, TokenBucket
+
+THROTTLED = (
+    b'<Response><Errors><Error><Code>RequestLimitExceeded</Code>'
+    b'<Message>Request limit exceeded.</Message></Error></Errors>'
+    b'</Response>'
+)
+
+
+class _Raw:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+def test_token_bucket_halves_on_throttling_and_recovers():
+    bucket = TokenBucket(rate=10)
+    bucket.throttled()
+    assert bucket.rate == 5
+    assert bucket.throttled_count == 1
+
+    for _ in range(5):
+        bucket.succeeded()
+    assert 5 < bucket.rate < 6
+
+
+def test_token_bucket_stays_within_bounds():
+    bucket = TokenBucket(rate=1, min_rate=0.5, max_rate=2)
+    bucket.throttled()
+    bucket.throttled()
+    assert bucket.rate == 0.5
+
+    for _ in range(100):
+        bucket.succeeded()
+    assert bucket.rate == 2
+
+
+def test_token_bucket_waits_when_empty():
+    bucket = TokenBucket(rate=2)
+    with patch('time.sleep') as sleep:
+        assert bucket.acquire() == 0
+        bucket.tokens = 0.0
+        with patch('time.monotonic', return_value=bucket._updated):
+            with pytest.raises(StopIteration):
+                sleep.side_effect = StopIteration
+                bucket.acquire()
+    sleep.assert_called_once_with(0.5)
+
+
+def test_rate_limiter_tracks_buckets_per_operation_and_region():
+    limiter = RateLimiter(rate=8)
+    limiter._response_received(
+        'us-east-1', 'response-received.ec2.DescribeInstances',
+        parsed_response={'Error': {'Code': 'RequestLimitExceeded'}}
+    )
+    limiter._response_received(
+        'eu-west-1', 'response-received.ec2.DescribeInstances',
+        parsed_response={'Reservations': []}
+    )
+    limiter._response_received(
+        None, 'response-received.iam.ListUsers',
+        parsed_response={'Error': {'Code': 'AccessDenied'}}
+    )
+
+    rates = limiter.rates()
+    assert rates[('ec2', 'DescribeInstances', 'us-east-1')] == {
+        'rate': 4.0, 'throttled': 1
+    }
+    assert rates[('ec2', 'DescribeInstances', 'eu-west-1')]['rate'] > 8
+    assert rates[('iam', 'ListUsers', None)] == {'rate': 8, 'throttled': 0}
+
+
+def test_rate_limiter_sees_every_botocore_attempt():
+    limiter = RateLimiter(rate=80)
+    client = limiter.attach(boto3.client(
+        'ec2', region_name='us-east-1', aws_access_key_id='testing',
+        aws_secret_access_key='testing',
+        config=Config(
+            retries={'mode': 'standard', 'total_max_attempts': 3}
+        )
+    ), 'us-east-1')
+
+    def throttled(request, **kwargs):
+        return AWSResponse(request.url, 503, {}, _Raw(THROTTLED))
+
+    client.meta.events.register('before-send', throttled)
+    with patch('time.sleep'):
+        with pytest.raises(ClientError):
+            client.describe_regions()
+
+    rates = limiter.rates()[('ec2', 'DescribeRegions', 'us-east-1')]
+    assert rates == {'rate': 10.0, 'throttled': 3}
+
+
+def test_client_factory_attaches_its_rate_limiter():
+    limiter = RateLimiter()
+    factory = ClientFactory(rate_limiter=limiter)
+    with patch('boto3.client') as mock_client:
+        factory.client('iam')
+
+    registered = [
+        c.args[0]
+        for c in mock_client.return_value.meta.events.register.call_args_list
+    ]
+    assert registered == ['before-send', 'response-received']
@@ -0,0 +1,56 @@
+from unittest.mock import Mock, patch
+from scanner import regions
+
+
+def _regional_client(region):
+    client = Mock()
+    client.describe_regions.return_value = {
+        'Regions': [{'RegionName': 'us-east-1'}, {'RegionName': 'eu-west-1'}]
+    }
+    client.describe_security_groups.return_value = {
+        'SecurityGroups': [{
+            'GroupId': f'sg-{region}',
+            'IpPermissions': [{
+                'IpProtocol': 'tcp',
+                'FromPort': 22,
+                'ToPort': 22,
+                'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
+            }]
+        }]
+    }
+    client.describe_network_interfaces.return_value = {
+        'NetworkInterfaces': []
+    }
+    return client
+
+
+def test_scan_fans_out_over_enabled_regions():
+    clients = {}
+
+    def make_client(service, region_name=None, config=None):
+        return clients.setdefault(region_name, _regional_client(region_name))
+
+    with patch('boto3.client', side_effect=make_client):
+        assert regions.enabled_regions(refresh=True) == [
+            'eu-west-1', 'us-east-1'
+        ]
+        findings = regions.scan(services=('sg',), max_workers=2)
+
+    clients[None].describe_regions.assert_called_once()
+    assert sorted((f['resource'], f['region']) for f in findings) == [
+        ('sg-eu-west-1', 'eu-west-1'),
+        ('sg-us-east-1', 'us-east-1'),
+    ]
+
+
+def test_merge_reports_failing_tasks(capsys):
+    def broken():
+        raise RuntimeError("region disabled")
+
+    items = list(regions.merge([
+        ('ok', lambda: iter([1, 2])),
+        ('broken', broken),
+    ]))
+
+    assert sorted(items) == [1, 2]
+    assert "Error scanning broken: region disabled" in capsys.readouterr().out
@@ -1,13 +1,16 @@
+import threading
 import pytest
 from unittest.mock import Mock, patch
 from botocore.exceptions import ClientError
-from scanner.s3 import scan
+from scanner.s3 import iter_scan, scan
+from scanner.state import StateStore
 
 
 @pytest.fixture
 def mock_s3_client():
     with patch('boto3.client') as mock_client:
         s3 = Mock()
+        s3.get_bucket_location.return_value = {'LocationConstraint': None}
         mock_client.return_value = s3
         yield s3
 
@@ -155,3 +158,161 @@ def test_scan_s3_encryption_disabled(mock_s3_client):
         f['issue'] == 'Bucket encryption is not enabled'
         for f in findings
     )
+
+
+def test_scan_s3_concurrent_order_is_deterministic(mock_s3_client):
+    # Setup mock response
+    mock_s3_client.list_buckets.return_value = {
+        'Buckets': [{'Name': f'bucket-{i}'} for i in range(20)]
+    }
+    mock_s3_client.get_bucket_acl.return_value = {
+        'Grants': []
+    }
+    mock_s3_client.get_bucket_versioning.return_value = {
+        'Status': 'Disabled'
+    }
+    mock_s3_client.get_bucket_logging.return_value = {}
+    mock_s3_client.get_bucket_encryption.return_value = {
+        'ServerSideEncryptionConfiguration': {
+            'Rules': [{
+                'ApplyServerSideEncryptionByDefault': {
+                    'SSEAlgorithm': 'AES256'
+                }
+            }]
+        }
+    }
+
+    # Run scan
+    serial = scan(max_workers=1)
+    concurrent = scan(max_workers=8)
+
+    # Assert
+    assert concurrent == serial
+    assert [f['resource'] for f in concurrent[:4]] == [
+        'bucket-0', 'bucket-0', 'bucket-1', 'bucket-1'
+    ]
+    assert [f['issue'] for f in concurrent[:2]] == [
+        'Bucket versioning is not enabled',
+        'Bucket access logging is not enabled'
+    ]
+
+
+def test_iter_scan_s3_bounds_buckets_in_flight(mock_s3_client):
+    # Setup mock response
+    mock_s3_client.list_buckets.return_value = {
+        'Buckets': [{'Name': f'bucket-{i}'} for i in range(50)]
+    }
+    mock_s3_client.get_bucket_acl.return_value = {'Grants': []}
+    mock_s3_client.get_bucket_versioning.return_value = {
+        'Status': 'Disabled'
+    }
+    mock_s3_client.get_bucket_logging.return_value = {
+        'LoggingEnabled': {'TargetBucket': 'logs'}
+    }
+    mock_s3_client.get_bucket_encryption.return_value = {}
+
+    # Run scan
+    findings = iter_scan(max_workers=4)
+    first = next(findings)
+
+    # Assert
+    assert first['resource'] == 'bucket-0'
+    assert mock_s3_client.get_bucket_acl.call_count <= 4
+    assert len(list(findings)) == 99
+
+
+def test_scan_s3_skips_unchanged_buckets(mock_s3_client, tmp_path):
+    # Setup mock response
+    mock_s3_client.list_buckets.return_value = {
+        'Buckets': [{'Name': 'test-bucket', 'CreationDate': '2024-01-01'}]
+    }
+    mock_s3_client.get_bucket_acl.return_value = {'Grants': []}
+    mock_s3_client.get_bucket_versioning.return_value = {
+        'Status': 'Disabled'
+    }
+    mock_s3_client.get_bucket_logging.return_value = {}
+    mock_s3_client.get_bucket_encryption.return_value = {}
+    state = StateStore(str(tmp_path / 'state.db'))
+
+    # Run scan
+    first = scan(state=state)
+    second = scan(state=state)
+
+    # Assert
+    assert second == first
+    mock_s3_client.get_bucket_acl.assert_called_once()
+    assert state.stats() == {'reused': 1, 'refreshed': 1}
+
+
+def test_scan_s3_uses_regional_clients():
+    with patch('boto3.client') as mock_client:
+        default = Mock()
+        regional = Mock()
+        mock_client.side_effect = (
+            lambda service, region_name=None, config=None:
+            regional if region_name == 'ap-southeast-3' else default
+        )
+        default.list_buckets.return_value = {
+            'Buckets': [
+                {'Name': 'jakarta-bucket'},
+                {'Name': 'listed-bucket', 'BucketRegion': 'ap-southeast-3'}
+            ]
+        }
+        default.get_bucket_location.return_value = {
+            'LocationConstraint': 'ap-southeast-3'
+        }
+        regional.get_bucket_acl.return_value = {'Grants': []}
+        regional.get_bucket_versioning.return_value = {'Status': 'Disabled'}
+        regional.get_bucket_logging.return_value = {'LoggingEnabled': True}
+        regional.get_bucket_encryption.return_value = {
+            'ServerSideEncryptionConfiguration': {'Rules': []}
+        }
+
+        findings = scan(max_workers=4)
+
+    assert [f['resource'] for f in findings] == [
+        'jakarta-bucket', 'listed-bucket'
+    ]
+    # The region comes from ListBuckets when present, so only the first
+    # bucket needs a location lookup, and no checks hit the default client.
+    default.get_bucket_location.assert_called_once_with(
+        Bucket='jakarta-bucket'
+    )
+    default.get_bucket_versioning.assert_not_called()
+    assert regional.get_bucket_versioning.call_count == 2
+    # One client per region, each sized to the scan concurrency.
+    config = mock_client.call_args_list[-1].kwargs['config']
+    assert config.max_pool_connections == 4
+    assert mock_client.call_count == 2
+
+
+def test_scan_s3_runs_bucket_calls_concurrently(mock_s3_client):
+    # Setup mock response: every call waits until all four have started
+    barrier = threading.Barrier(4, timeout=5)
+
+    def call(result):
+        def wait(**kwargs):
+            barrier.wait()
+            return result
+        return wait
+
+    mock_s3_client.list_buckets.return_value = {
+        'Buckets': [{'Name': 'test-bucket', 'BucketRegion': 'us-east-1'}]
+    }
+    mock_s3_client.get_bucket_acl.side_effect = call({'Grants': []})
+    mock_s3_client.get_bucket_versioning.side_effect = call(
+        {'Status': 'Disabled'}
+    )
+    mock_s3_client.get_bucket_logging.side_effect = call(
+        {'LoggingEnabled': {'TargetBucket': 'logs'}}
+    )
+    mock_s3_client.get_bucket_encryption.side_effect = call({})
+
+    # Run scan
+    findings = scan(max_workers=5)
+
+    # Assert
+    assert [f['issue'] for f in findings] == [
+        'Bucket versioning is not enabled',
+        'Bucket encryption is not enabled'
+    ]
@@ -1,12 +1,15 @@
 import pytest
 from unittest.mock import Mock, patch
-from scanner.sg import scan
+from scanner.sg import classify, collect, scan
 
 
 @pytest.fixture
 def mock_ec2_client():
     with patch('boto3.client') as mock_client:
         ec2 = Mock()
+        ec2.describe_network_interfaces.return_value = {
+            'NetworkInterfaces': []
+        }
         mock_client.return_value = ec2
         yield ec2
 
@@ -105,3 +108,235 @@ def test_scan_sg_rdp_open(mock_ec2_client):
         f['issue'] == 'Open to the world on port 3389'
         for f in findings
     )
+
+
+def test_scan_sg_reads_every_page(mock_ec2_client):
+    # Setup mock response
+    mock_ec2_client.describe_security_groups.side_effect = [
+        {
+            'SecurityGroups': [{
+                'GroupId': 'sg-page1',
+                'IpPermissions': [{
+                    'FromPort': 22,
+                    'ToPort': 22,
+                    'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
+                }]
+            }],
+            'NextToken': 'page-2'
+        },
+        {
+            'SecurityGroups': [{
+                'GroupId': 'sg-page2',
+                'IpPermissions': [{
+                    'FromPort': 3389,
+                    'ToPort': 3389,
+                    'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
+                }]
+            }]
+        }
+    ]
+
+    # Run scan
+    findings = scan()
+
+    # Assert
+    assert [f['resource'] for f in findings] == ['sg-page1', 'sg-page2']
+    assert (
+        mock_ec2_client.describe_security_groups.call_args.kwargs[
+            'NextToken'
+        ] == 'page-2'
+    )
+
+
+def test_scan_sg_port_range_covers_sensitive_ports(mock_ec2_client):
+    # Setup mock response
+    mock_ec2_client.describe_security_groups.return_value = {
+        'SecurityGroups': [{
+            'GroupId': 'sg-1234567890',
+            'IpPermissions': [{
+                'IpProtocol': 'tcp',
+                'FromPort': 0,
+                'ToPort': 65535,
+                'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
+            }, {
+                'IpProtocol': 'tcp',
+                'FromPort': 8000,
+                'ToPort': 8080,
+                'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
+            }]
+        }]
+    }
+
+    # Run scan
+    findings = scan(reachability=False)
+
+    # Assert
+    assert [(f['issue'], f['risk']) for f in findings] == [
+        ('Open to the world on port 22', 'HIGH'),
+        ('Open to the world on port 80', 'MEDIUM'),
+        ('Open to the world on port 443', 'MEDIUM'),
+        ('Open to the world on ports 0-65535', 'LOW'),
+        ('Open to the world on ports 8000-8080', 'LOW'),
+        ('Open to the world on port 3389', 'HIGH'),
+    ]
+
+
+def test_port_index_lookup():
+    from scanner.sg import PortIndex
+
+    index = PortIndex([(3389, 3389, 'rdp'), (20, 22, 'ftp-ssh'),
+                       (80, 80, 'http')])
+
+    assert [e[2] for e in index.covering(21, 80)] == ['ftp-ssh', 'http']
+    assert index.covering(23, 79) == []
+    with pytest.raises(ValueError):
+        PortIndex([(20, 22, 'a'), (22, 22, 'b')])
+
+
+def test_scan_sg_ipv6_broad_and_prefix_list_sources(mock_ec2_client):
+    # Setup mock response
+    mock_ec2_client.describe_security_groups.return_value = {
+        'SecurityGroups': [{
+            'GroupId': 'sg-1234567890',
+            'IpPermissions': [{
+                'IpProtocol': 'tcp',
+                'FromPort': 22,
+                'ToPort': 22,
+                'IpRanges': [
+                    {'CidrIp': '0.0.0.0/1'},
+                    {'CidrIp': '10.0.0.0/8'},
+                    {'CidrIp': '203.0.113.0/24'}
+                ],
+                'Ipv6Ranges': [{'CidrIpv6': '::/0'}],
+                'PrefixListIds': [{'PrefixListId': 'pl-123'}]
+            }]
+        }]
+    }
+    mock_ec2_client.get_managed_prefix_list_entries.return_value = {
+        'Entries': [{'Cidr': '0.0.0.0/0'}, {'Cidr': '192.168.0.0/16'}]
+    }
+
+    # Run scan
+    findings = scan(trusted=['203.0.113.0/24'])
+
+    # Assert
+    assert [f['issue'] for f in findings] == [
+        'Open to 0.0.0.0/1 on port 22',
+        'Open to the world on port 22',
+        'Open to the world on port 22',
+    ]
+
+
+def test_cidr_trie_longest_prefix():
+    from scanner.cidr import CidrTrie
+
+    trie = CidrTrie([('10.0.0.0/8', 'trusted'), ('10.1.0.0/16', 'public'),
+                     ('2001:db8::/32', 'trusted')])
+
+    assert trie.lookup('10.2.3.0/24') == 'trusted'
+    assert trie.lookup('10.1.2.3/32') == 'public'
+    assert trie.lookup('10.0.0.0/7') is None
+    assert trie.lookup('2001:db8:1::/48') == 'trusted'
+    assert trie.lookup('8.8.8.8/32') is None
+
+
+def test_scan_sg_scores_reachability(mock_ec2_client):
+    # Setup mock response
+    open_http = [{
+        'IpProtocol': 'tcp',
+        'FromPort': 80,
+        'ToPort': 80,
+        'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
+    }]
+    mock_ec2_client.describe_security_groups.return_value = {
+        'SecurityGroups': [
+            {'GroupId': 'sg-attached', 'IpPermissions': open_http},
+            {'GroupId': 'sg-unused', 'IpPermissions': open_http}
+        ]
+    }
+    mock_ec2_client.describe_network_interfaces.side_effect = [
+        {
+            'NetworkInterfaces': [{
+                'NetworkInterfaceId': 'eni-1',
+                'Attachment': {'InstanceId': 'i-1'},
+                'Groups': [{'GroupId': 'sg-attached'}]
+            }],
+            'NextToken': 'page-2'
+        },
+        {
+            'NetworkInterfaces': [
+                {
+                    # Attached to a load balancer, not an instance
+                    'NetworkInterfaceId': 'eni-2',
+                    'Status': 'in-use',
+                    'Attachment': {'AttachmentId': 'ela-attach-1'},
+                    'Groups': [{'GroupId': 'sg-attached'}]
+                },
+                {
+                    # Detached, so it exposes nothing
+                    'NetworkInterfaceId': 'eni-3',
+                    'Status': 'available',
+                    'Groups': [{'GroupId': 'sg-unused'}]
+                }
+            ]
+        }
+    ]
+
+    # Run scan
+    findings = scan()
+
+    # Assert
+    assert [
+        (f['resource'], f['risk'], f['attachments']) for f in findings
+    ] == [
+        ('sg-attached', 'HIGH', 2),
+        ('sg-unused', 'LOW', 0),
+    ]
+
+
+def test_scan_sg_classifies_each_permission_once(mock_ec2_client):
+    # Setup mock response
+    mock_ec2_client.describe_security_groups.return_value = {
+        'SecurityGroups': [{
+            'GroupId': f'sg-{i}',
+            'IpPermissions': [{
+                'IpProtocol': 'tcp',
+                'FromPort': 0,
+                'ToPort': 65535,
+                'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
+            }]
+        } for i in range(2)]
+    }
+
+    # Run scan
+    with patch('scanner.sg.classify', wraps=classify) as classify_spy:
+        findings = scan(reachability=False)
+
+    # Assert
+    assert len(findings) == 10
+    assert classify_spy.call_count == 2
+
+
+def test_collected_records_carry_their_exposures(mock_ec2_client):
+    # Setup mock response
+    mock_ec2_client.describe_security_groups.return_value = {
+        'SecurityGroups': [{
+            'GroupId': 'sg-1234567890',
+            'IpPermissions': [{
+                'IpProtocol': 'tcp',
+                'FromPort': 22,
+                'ToPort': 22,
+                'IpRanges': [
+                    {'CidrIp': '0.0.0.0/0'}, {'CidrIp': '10.0.0.0/8'}
+                ]
+            }]
+        }]
+    }
+
+    # Run collection
+    [(resource_type, record)] = list(collect(reachability=False))
+
+    # Assert
+    assert record['Exposures'] == {
+        'sg_ssh_open': [('0.0.0.0/0', 'port 22')]
+    }
@@ -0,0 +1,39 @@
+import os
+from unittest.mock import Mock, patch
+from scanner import sg
+from scanner.snapshot import capture, replay
+
+
+def test_snapshot_replays_without_aws_calls(tmp_path):
+    with patch('boto3.client') as mock_client:
+        client = Mock()
+        mock_client.return_value = client
+        client.describe_security_groups.return_value = {
+            'SecurityGroups': [{
+                'GroupId': 'sg-1234567890',
+                'IpPermissions': [{
+                    'IpProtocol': 'tcp',
+                    'FromPort': 22,
+                    'ToPort': 22,
+                    'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
+                }]
+            }]
+        }
+        client.describe_network_interfaces.return_value = {
+            'NetworkInterfaces': []
+        }
+
+        counts = capture(str(tmp_path), services=['sg'])
+        live = sg.scan()
+
+    assert list(counts.values()) == [1]
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        list(counts) + ['manifest.json']
+    )
+
+    with patch('boto3.client') as mock_client:
+        replayed = list(replay(str(tmp_path)))
+        mock_client.assert_not_called()
+
+    assert replayed == live
+    assert replayed[0]['issue'] == 'Open to the world on port 22'
@@ -0,0 +1,26 @@
+from scanner.state import StateStore
+
+
+def test_state_store_reuses_unchanged_resources(tmp_path):
+    state = StateStore(str(tmp_path / 'state.db'))
+    metadata = {'CreationDate': '2024-01-01'}
+
+    digest, value = state.lookup('s3', 'bucket', metadata)
+    assert value is None
+    state.save('s3', 'bucket', digest, {'Acl': {'Grants': []}})
+    state.close()
+
+    state = StateStore(str(tmp_path / 'state.db'))
+    assert state.lookup('s3', 'bucket', metadata)[1] == {
+        'Acl': {'Grants': []}
+    }
+    assert state.lookup('s3', 'bucket', {'CreationDate': 'changed'})[1] is None
+    assert state.stats() == {'reused': 1, 'refreshed': 1}
+
+
+def test_state_store_forces_full_refresh(tmp_path):
+    state = StateStore(str(tmp_path / 'state.db'), full_refresh_seconds=0)
+    digest, _ = state.lookup('ec2', 'i-1234567890abcdef0', {})
+    state.save('ec2', 'i-1234567890abcdef0', digest, True)
+
+    assert state.lookup('ec2', 'i-1234567890abcdef0', {})[1] is None
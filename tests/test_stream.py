@@ -0,0 +1,90 @@
+import json
+import threading
+from report.stream import events, ndjson, sse
+from scanner.finding import Finding
+from scanner.rules import cis_rules
+
+
+def _finding(resource):
+    return Finding(
+        'sg_ssh_open', resource, 'Security Group',
+        'Port 22 open to 0.0.0.0/0'
+    )
+
+
+def test_events_stream_findings_with_progress():
+    stream = list(events(
+        (_finding(f'sg-{i}') for i in range(5)), progress_every=2
+    ))
+
+    names = [event for event, data in stream]
+    assert names == [
+        'finding', 'finding', 'progress', 'finding', 'finding', 'progress',
+        'finding', 'done'
+    ]
+    assert stream[0][1]['resource'] == 'sg-0'
+    assert stream[0][1]['cis_rule'] == cis_rules['sg_ssh_open']['cis_rule']
+    assert stream[2][1]['findings'] == 2
+    assert stream[-1][1]['findings'] == 5
+    assert 'rules' not in stream[-1][1]
+
+
+def test_compact_events_send_the_rule_catalog_once():
+    stream = list(events([_finding('sg-1'), _finding('sg-2')], compact=True))
+
+    assert stream[0] == ('finding', {
+        'resource': 'sg-1', 'type': 'Security Group', 'risk': 'HIGH',
+        'issue': 'Port 22 open to 0.0.0.0/0', 'rule': 'sg_ssh_open'
+    })
+    assert list(stream[-1][1]['rules']) == ['sg_ssh_open']
+
+
+def test_events_send_heartbeats_while_the_scan_is_quiet():
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        yield _finding('sg-1')
+
+    stream = events(slow(), heartbeat=0.01)
+    assert next(stream)[0] == 'heartbeat'
+    release.set()
+    assert [event for event, data in stream][-2:] == ['finding', 'done']
+
+
+def test_scan_errors_become_error_events():
+    def broken():
+        yield _finding('sg-1')
+        raise RuntimeError('AccessDenied')
+
+    stream = list(events(broken()))
+    assert [event for event, data in stream] == ['finding', 'error', 'done']
+    assert stream[1][1] == {'error': 'AccessDenied'}
+
+
+def test_closing_the_stream_stops_the_scan():
+    closed = threading.Event()
+
+    def endless():
+        try:
+            while True:
+                yield _finding('sg-1')
+        finally:
+            closed.set()
+
+    stream = events(endless())
+    assert next(stream)[0] == 'finding'
+    stream.close()
+    assert closed.wait(5)
+
+
+def test_encoders():
+    pairs = [('finding', {'resource': 'sg-1'}), ('done', {'findings': 1})]
+
+    lines = list(ndjson(pairs))
+    assert [json.loads(line) for line in lines] == [
+        {'event': 'finding', 'data': {'resource': 'sg-1'}},
+        {'event': 'done', 'data': {'findings': 1}}
+    ]
+    assert all(line.endswith('\n') for line in lines)
+    assert list(sse(pairs))[1] == 'event: done\ndata: {"findings": 1}\n\n'